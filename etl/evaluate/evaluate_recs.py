@@ -0,0 +1,264 @@
+# etl/evaluate/evaluate_recs.py
+# ------------------------------------------------------------
+# Đánh giá hệ gợi ý (recommender) trên dữ liệu ratings đã làm sạch
+# Đầu vào : etl/intermediate/ratings.cleaned.parquet
+# Đầu ra  : etl/reports/rec_evaluation.csv
+# Nội dung:
+#   - Chia train/test theo thời gian cho từng user (leave-last-N)
+#     hoặc theo mốc thời gian chung (global cutoff), KHÔNG lặp Python
+#     qua từng user: sort (userId, timestamp) + offset theo nhóm
+#   - Tính precision@K, recall@K, NDCG@K, MAP@K, coverage cho bất kỳ
+#     recommender nào (callable), vector hoá theo batch user và chia
+#     batch cho process pool
+# Quy ước recommender:
+#   recommender(user_ids: np.ndarray[int64], k: int) -> np.ndarray (len(user_ids), k)
+#   chứa movieId, ô trống điền -1. Callable phải pickle được (hàm/ lớp
+#   khai báo ở mức module) để gửi sang worker.
+# ------------------------------------------------------------
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import pandas as pd
+import numpy as np
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+REPORTS = ROOT / "etl" / "reports"
+REPORTS.mkdir(parents=True, exist_ok=True)
+OUTPUT = REPORTS / "rec_evaluation.csv"
+
+RATINGS_PATH = INTERMEDIATE / "ratings.cleaned.parquet"
+
+sys.path.insert(0, str(ROOT))
+from etl.transform.timestamps import epoch_seconds   # noqa: E402
+
+
+# ============ CHIA TRAIN / TEST THEO THỜI GIAN ============
+def temporal_split(ratings: pd.DataFrame, mode: str = "leave_last", n: int = 1, cutoff=None):
+    """
+    Chia ratings thành (train, test) theo thời gian.
+    - mode="leave_last": N rating mới nhất của mỗi user vào test
+      (chỉ với user có > N rating, để user nào cũng còn lịch sử train)
+    - mode="cutoff"    : rating có timestamp >= cutoff vào test
+    Không lặp qua user: sort ổn định theo (userId, timestamp), tính
+    offset đầu/cuối mỗi nhóm rồi suy ra vị trí tính từ cuối.
+    """
+    ts = epoch_seconds(ratings["timestamp"])          # NaT -> -1 (cũ nhất)
+
+    if mode == "cutoff":
+        if cutoff is None:
+            raise ValueError("mode='cutoff' cần tham số cutoff")
+        if isinstance(cutoff, (int, np.integer)):
+            cut = int(cutoff)
+        else:
+            # Mốc không có tz -> coi là UTC; có tz -> đổi sang UTC
+            cut = pd.Timestamp(cutoff)
+            cut = cut.tz_localize("UTC") if cut.tzinfo is None else cut.tz_convert("UTC")
+            cut = int(cut.timestamp())
+        test_mask = ts >= cut
+        return ratings[~test_mask].reset_index(drop=True), ratings[test_mask].reset_index(drop=True)
+
+    if mode != "leave_last":
+        raise ValueError(f"mode không hợp lệ: {mode}")
+
+    users = ratings["userId"].to_numpy()
+    # lexsort: khoá cuối là khoá chính -> sort theo userId rồi timestamp
+    order = np.lexsort((ts, users))
+    sorted_users = users[order]
+
+    # Ranh giới nhóm: vị trí userId thay đổi
+    starts = np.flatnonzero(np.r_[True, sorted_users[1:] != sorted_users[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_users)])
+    ends = starts + counts
+
+    # Vị trí tính từ cuối nhóm (1 = rating mới nhất)
+    group_end = np.repeat(ends, counts)
+    rank_from_end = group_end - np.arange(len(sorted_users))
+    eligible = np.repeat(counts > n, counts)
+
+    test_sorted = (rank_from_end <= n) & eligible
+    test_mask = np.empty_like(test_sorted)
+    test_mask[order] = test_sorted
+
+    return ratings[~test_mask].reset_index(drop=True), ratings[test_mask].reset_index(drop=True)
+
+
+# ============ METRICS (VECTOR HOÁ THEO BATCH) ============
+def _ground_truth_csr(test: pd.DataFrame):
+    """Gom test thành CSR: users (sorted), indptr, items (sorted, không trùng trong từng user)."""
+    u = test["userId"].to_numpy(dtype=np.int64)
+    m = test["movieId"].to_numpy(dtype=np.int64)
+    order = np.lexsort((m, u))
+    u, m = u[order], m[order]
+    # Bỏ cặp (user, movie) trùng để n_true (recall, IDCG) không bị đếm 2 lần
+    keep = np.r_[True, (u[1:] != u[:-1]) | (m[1:] != m[:-1])]
+    u, m = u[keep], m[keep]
+    users, starts = np.unique(u, return_index=True)
+    indptr = np.r_[starts, len(u)].astype(np.int64)
+    return users, indptr, m
+
+
+def batch_metrics(recs: np.ndarray, indptr: np.ndarray, items: np.ndarray, k: int) -> dict:
+    """
+    Tính metric cho 1 batch user, không lặp qua user.
+    recs   : (B, k) movieId gợi ý, -1 = trống
+    indptr : (B+1,) offset ground truth của từng user trong `items`
+    items  : movieId ground truth, đã sort trong từng user
+    Trả về dict mảng (B,) cho từng metric + mảng movieId đã gợi ý (unique).
+    """
+    recs = np.asarray(recs, dtype=np.int64)[:, :k]
+    b = recs.shape[0]
+    n_true = np.diff(indptr)
+
+    # Khoá đóng gói (hàng, movieId) -> tra hit bằng searchsorted trên ground truth
+    span = int(max(items.max(initial=0), recs.max(initial=0))) + 1
+    truth_rows = np.repeat(np.arange(b, dtype=np.int64), n_true)
+    truth_keys = truth_rows * span + items               # đã sort vì items sort trong từng hàng
+    rec_keys = np.arange(b, dtype=np.int64)[:, None] * span + np.where(recs >= 0, recs, 0)
+    if len(truth_keys):
+        pos = np.minimum(np.searchsorted(truth_keys, rec_keys), len(truth_keys) - 1)
+        hits = (recs >= 0) & (truth_keys[pos] == rec_keys)
+    else:
+        hits = np.zeros(recs.shape, dtype=bool)
+
+    n_hits = hits.sum(axis=1)
+    denom_true = np.maximum(n_true, 1)
+
+    precision = n_hits / k
+    recall = n_hits / denom_true
+
+    # NDCG: DCG / IDCG, IDCG tra bảng theo min(n_true, k)
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    idcg_table = np.r_[0.0, np.cumsum(discounts)]
+    idcg = idcg_table[np.minimum(n_true, k)]
+    ndcg = np.divide(dcg, idcg, out=np.zeros_like(dcg), where=idcg > 0)
+
+    # AP@K: trung bình precision@i tại các vị trí hit
+    cum_hits = np.cumsum(hits, axis=1)
+    prec_at_i = cum_hits / np.arange(1, k + 1)
+    ap = (prec_at_i * hits).sum(axis=1) / np.maximum(np.minimum(n_true, k), 1)
+
+    return {
+        "precision": precision,
+        "recall": recall,
+        "ndcg": ndcg,
+        "ap": ap,
+        "recommended": np.unique(recs[recs >= 0]),
+    }
+
+
+# ============ FAN-OUT QUA PROCESS POOL ============
+_WORKER_RECOMMENDER = None
+
+
+def _init_worker(recommender):
+    """Khởi tạo worker: giữ recommender trong biến toàn cục, chỉ pickle 1 lần/worker."""
+    global _WORKER_RECOMMENDER
+    _WORKER_RECOMMENDER = recommender
+
+
+def _eval_batch(args):
+    """Chạy recommender + metric cho 1 batch trong worker."""
+    user_ids, indptr, items, k = args
+    recs = _WORKER_RECOMMENDER(user_ids, k)
+    return batch_metrics(recs, indptr, items, k)
+
+
+def _iter_batches(users, indptr, items, k, batch_size):
+    for lo in range(0, len(users), batch_size):
+        hi = min(lo + batch_size, len(users))
+        sub_ptr = indptr[lo:hi + 1] - indptr[lo]
+        yield users[lo:hi], sub_ptr, items[indptr[lo]:indptr[hi]], k
+
+
+def evaluate(recommender, test: pd.DataFrame, k: int = 10, catalog_size: int = None,
+             batch_size: int = 1024, n_workers: int = None) -> dict:
+    """
+    Đánh giá `recommender` trên tập test.
+    - n_workers=None -> dùng os.cpu_count(); n_workers<=1 -> chạy tuần tự
+    - catalog_size: số phim trong catalog để tính coverage (mặc định: số movieId trong test)
+    Trả về dict: precision@k, recall@k, ndcg@k, map@k, coverage, n_users.
+    """
+    users, indptr, items = _ground_truth_csr(test)
+    if catalog_size is None:
+        catalog_size = int(test["movieId"].nunique())
+    batches = list(_iter_batches(users, indptr, items, k, batch_size))
+    n_workers = n_workers or os.cpu_count() or 1
+
+    if n_workers <= 1 or len(batches) <= 1:
+        _init_worker(recommender)
+        parts = [_eval_batch(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                 initargs=(recommender,)) as ex:
+            parts = list(ex.map(_eval_batch, batches))
+
+    def cat(key):
+        return np.concatenate([p[key] for p in parts]) if parts else np.zeros(0)
+
+    recommended = np.unique(cat("recommended"))
+    return {
+        f"precision@{k}": float(cat("precision").mean()) if len(users) else 0.0,
+        f"recall@{k}": float(cat("recall").mean()) if len(users) else 0.0,
+        f"ndcg@{k}": float(cat("ndcg").mean()) if len(users) else 0.0,
+        f"map@{k}": float(cat("ap").mean()) if len(users) else 0.0,
+        "coverage": round(len(recommended) / catalog_size, 4) if catalog_size else 0.0,
+        "n_users": int(len(users)),
+    }
+
+
+# ============ BASELINE ĐƠN GIẢN ============
+class MostPopular:
+    """Baseline: gợi ý top-K phim nhiều rating nhất trong train, bỏ phim user đã xem."""
+
+    def __init__(self, train: pd.DataFrame, pool: int = 500):
+        counts = train["movieId"].value_counts()
+        self.top = counts.index.to_numpy(dtype=np.int64)[:pool]
+        u = train["userId"].to_numpy(dtype=np.int64)
+        m = train["movieId"].to_numpy(dtype=np.int64)
+        self.span = int(max(m.max(initial=0), self.top.max(initial=0))) + 1
+        self.seen = np.unique(u * self.span + m)
+
+    def __call__(self, user_ids, k):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        cand = user_ids[:, None] * self.span + self.top[None, :]
+        pos = np.minimum(np.searchsorted(self.seen, cand), len(self.seen) - 1)
+        unseen = self.seen[pos] != cand
+        # Đẩy phim chưa xem lên đầu, giữ thứ tự phổ biến (sort ổn định)
+        order = np.argsort(~unseen, axis=1, kind="stable")
+        ranked = np.take_along_axis(np.broadcast_to(self.top, cand.shape), order, axis=1)[:, :k]
+        keep = np.take_along_axis(unseen, order, axis=1)[:, :k]
+        return np.where(keep, ranked, -1)
+
+
+# ============ MAIN ============
+def main(k: int = 10, n_last: int = 1):
+    if not RATINGS_PATH.exists():
+        raise FileNotFoundError(f"Thiếu file: {RATINGS_PATH}")
+
+    ratings = pd.read_parquet(RATINGS_PATH, columns=["userId", "movieId", "rating", "timestamp"])
+    print(f"[eval] ratings: {ratings.shape}")
+
+    train, test = temporal_split(ratings, mode="leave_last", n=n_last)
+    print(f"[eval] leave-last-{n_last}: train {train.shape}, test {test.shape}")
+
+    catalog_size = int(ratings["movieId"].nunique())
+    models = {"MostPopular": MostPopular(train)}
+
+    rows = []
+    for name, rec in models.items():
+        res = evaluate(rec, test, k=k, catalog_size=catalog_size)
+        res = {"model": name, "split": f"leave_last_{n_last}", **res}
+        rows.append(res)
+        print(f"[eval] {name}: {res}")
+
+    pd.DataFrame(rows).to_csv(OUTPUT, index=False, encoding="utf-8")
+    print(f"[eval] ✅ Wrote: {OUTPUT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# etl/features/aggregate_stats.py
+# ------------------------------------------------------------
+# Tổng hợp thống kê theo movie và theo user KHÔNG cần nạp toàn bộ ratings
+# Đầu vào : etl/intermediate/ratings.cleaned.parquet
+# Đầu ra  : etl/intermediate/movie_features.parquet
+#           etl/intermediate/user_features.parquet
+# Cách làm:
+#   - Đọc parquet theo từng row group / batch (streaming)
+#   - Cộng dồn sufficient statistics (count, sum, sum bình phương,
+#     timestamp đầu/cuối) vào mảng NumPy cấp phát sẵn, đánh chỉ số
+#     trực tiếp bằng id (np.bincount / np.minimum.at / np.maximum.at)
+#   - Mỗi worker trong process pool xử lý 1 nhóm row group rồi trả về
+#     mảng partial; tiến trình chính gộp lại (cộng / min / max)
+#   - Bộ nhớ chỉ phụ thuộc max id và batch_size, không phụ thuộc số rating
+# ------------------------------------------------------------
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+
+RATINGS_PATH = INTERMEDIATE / "ratings.cleaned.parquet"
+MOVIE_FEATURES = INTERMEDIATE / "movie_features.parquet"
+USER_FEATURES = INTERMEDIATE / "user_features.parquet"
+
+COLUMNS = ["userId", "movieId", "rating", "timestamp"]
+TS_NONE_MIN = np.iinfo(np.int64).max     # giá trị khởi tạo cho ts_min
+TS_NONE_MAX = np.iinfo(np.int64).min     # giá trị khởi tạo cho ts_max
+
+sys.path.insert(0, str(ROOT))
+from etl.transform.timestamps import arrow_epoch_seconds   # noqa: E402
+
+
+# ============ ACCUMULATOR ============
+def new_accumulator(size: int) -> dict:
+    """Mảng thống kê cấp phát sẵn, chỉ số = id gốc (0..size-1)."""
+    return {
+        "count": np.zeros(size, dtype=np.int64),
+        "sum": np.zeros(size, dtype=np.float64),
+        "sumsq": np.zeros(size, dtype=np.float64),
+        "ts_min": np.full(size, TS_NONE_MIN, dtype=np.int64),
+        "ts_max": np.full(size, TS_NONE_MAX, dtype=np.int64),
+    }
+
+
+def accumulate(acc: dict, ids: np.ndarray, rating: np.ndarray, ts: np.ndarray, has_ts: np.ndarray):
+    """Cộng 1 batch vào accumulator (in-place)."""
+    size = len(acc["count"])
+    acc["count"] += np.bincount(ids, minlength=size)
+    acc["sum"] += np.bincount(ids, weights=rating, minlength=size)
+    acc["sumsq"] += np.bincount(ids, weights=rating * rating, minlength=size)
+    np.minimum.at(acc["ts_min"], ids[has_ts], ts[has_ts])
+    np.maximum.at(acc["ts_max"], ids[has_ts], ts[has_ts])
+
+
+def merge(a: dict, b: dict) -> dict:
+    """Gộp 2 partial: cộng count/sum/sumsq, min/max timestamp."""
+    return {
+        "count": a["count"] + b["count"],
+        "sum": a["sum"] + b["sum"],
+        "sumsq": a["sumsq"] + b["sumsq"],
+        "ts_min": np.minimum(a["ts_min"], b["ts_min"]),
+        "ts_max": np.maximum(a["ts_max"], b["ts_max"]),
+    }
+
+
+# ============ STREAMING ============
+def max_ids(pf: pq.ParquetFile):
+    """
+    Lấy max userId / movieId từ thống kê row group (không cần đọc dữ liệu);
+    nếu file không có statistics thì quét riêng 2 cột id theo batch.
+    """
+    names = pf.schema_arrow.names
+    maxima = {}
+    for col in ("userId", "movieId"):
+        j = names.index(col)
+        stats = [pf.metadata.row_group(i).column(j).statistics for i in range(pf.metadata.num_row_groups)]
+        if stats and all(s is not None and s.has_min_max for s in stats):
+            maxima[col] = max(int(s.max) for s in stats)
+        else:
+            maxima[col] = max(
+                (int(pc.max(b.column(0)).as_py() or 0) for b in pf.iter_batches(columns=[col])),
+                default=0,
+            )
+    return maxima["userId"], maxima["movieId"]
+
+
+def _batch_arrays(batch):
+    """RecordBatch -> mảng NumPy (ids int64, rating float64, ts int64 giây, mask có ts)."""
+    users = batch.column("userId").to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+    movies = batch.column("movieId").to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+    rating = batch.column("rating").to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+    ts_col = batch.column("timestamp")
+    has_ts = ~ts_col.is_null().to_numpy(zero_copy_only=False)
+    return users, movies, rating, arrow_epoch_seconds(ts_col), has_ts
+
+
+def aggregate_row_groups(path: str, row_groups, n_users: int, n_movies: int, batch_size: int = 1_000_000):
+    """Worker: stream các row group được giao, trả về (acc_user, acc_movie)."""
+    pf = pq.ParquetFile(path)
+    acc_user = new_accumulator(n_users)
+    acc_movie = new_accumulator(n_movies)
+    for batch in pf.iter_batches(batch_size=batch_size, row_groups=list(row_groups), columns=COLUMNS):
+        users, movies, rating, ts, has_ts = _batch_arrays(batch)
+        accumulate(acc_user, users, rating, ts, has_ts)
+        accumulate(acc_movie, movies, rating, ts, has_ts)
+    return acc_user, acc_movie
+
+
+def _worker(args):
+    return aggregate_row_groups(*args)
+
+
+# ============ XUẤT BẢNG ============
+def to_table(acc: dict, key: str) -> pd.DataFrame:
+    """Accumulator -> DataFrame, chỉ giữ id có ít nhất 1 rating (dense id theo thứ tự id)."""
+    ids = np.flatnonzero(acc["count"])
+    n = acc["count"][ids]
+    s = acc["sum"][ids]
+    ss = acc["sumsq"][ids]
+    mean = s / n
+    # std mẫu (ddof=1) giống pandas; 1 rating -> 0 như export_dataset
+    var = np.divide(ss - s * mean, n - 1, out=np.zeros(len(n)), where=n > 1)
+    std = np.sqrt(np.clip(var, 0.0, None))
+
+    ts_min = acc["ts_min"][ids]
+    ts_max = acc["ts_max"][ids]
+    no_ts = ts_min == TS_NONE_MIN
+    first = pd.to_datetime(np.where(no_ts, 0, ts_min), unit="s", utc=True)
+    last = pd.to_datetime(np.where(no_ts, 0, ts_max), unit="s", utc=True)
+
+    df = pd.DataFrame({
+        key: ids,
+        "dense_id": np.arange(len(ids), dtype=np.int32),
+        "rating_count": n,
+        "avg_rating": mean,
+        "rating_std": std,
+        "first_rated": first,
+        "last_rated": last,
+    })
+    df.loc[no_ts, ["first_rated", "last_rated"]] = pd.NaT
+    df["active_days"] = (df["last_rated"] - df["first_rated"]).dt.days
+    return df
+
+
+def movie_stats(path: Path = RATINGS_PATH, batch_size: int = 1_000_000) -> pd.DataFrame:
+    """
+    Chỉ thống kê theo movie, chạy tuần tự, không ghi file (cho export_dataset
+    khi movie_features.parquet chưa có / cũ hơn ratings). Cùng phép tính với
+    aggregate_stats -> CSV xuất ra không phụ thuộc nhánh nào đã chạy.
+    """
+    if not Path(path).exists():
+        raise FileNotFoundError(f"Thiếu file: {path}")
+    pf = pq.ParquetFile(path)
+    _, max_movie = max_ids(pf)
+    acc = new_accumulator(max_movie + 1)
+    for batch in pf.iter_batches(batch_size=batch_size, columns=COLUMNS):
+        _, movies, rating, ts, has_ts = _batch_arrays(batch)
+        accumulate(acc, movies, rating, ts, has_ts)
+    return to_table(acc, "movieId")
+
+
+def aggregate_stats(path: Path = RATINGS_PATH, n_workers: int = None, batch_size: int = 1_000_000):
+    """
+    Chạy tổng hợp out-of-core và ghi movie_features.parquet / user_features.parquet.
+    Row group được chia đều cho các worker; file 1 row group -> chạy tuần tự.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Thiếu file: {path}")
+
+    pf = pq.ParquetFile(path)
+    max_user, max_movie = max_ids(pf)
+    n_groups = pf.metadata.num_row_groups
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, n_groups))
+    print(f"[features] {pf.metadata.num_rows} ratings, {n_groups} row group(s), "
+          f"max userId={max_user}, max movieId={max_movie}, workers={n_workers}")
+
+    chunks = [range(n_groups)[i::n_workers] for i in range(n_workers)]
+    tasks = [(str(path), rg, max_user + 1, max_movie + 1, batch_size) for rg in chunks if len(rg)]
+
+    if not tasks:
+        partials = [(new_accumulator(max_user + 1), new_accumulator(max_movie + 1))]
+    elif len(tasks) == 1:
+        partials = [_worker(tasks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=len(tasks)) as ex:
+            partials = list(ex.map(_worker, tasks))
+
+    acc_user, acc_movie = partials[0]
+    for u, m in partials[1:]:
+        acc_user = merge(acc_user, u)
+        acc_movie = merge(acc_movie, m)
+
+    movie_features = to_table(acc_movie, "movieId")
+    user_features = to_table(acc_user, "userId")
+
+    movie_features.to_parquet(MOVIE_FEATURES, index=False)
+    user_features.to_parquet(USER_FEATURES, index=False)
+    print(f"[features] movie_features: {movie_features.shape}, user_features: {user_features.shape}")
+    print(f"[features] ✅ Wrote: {MOVIE_FEATURES}")
+    print(f"[features] ✅ Wrote: {USER_FEATURES}")
+    return movie_features, user_features
+
+
+if __name__ == "__main__":
+    aggregate_stats()
@@ -0,0 +1,257 @@
+# etl/features/compact_ratings.py
+# ------------------------------------------------------------
+# Biểu diễn ratings gọn trong bộ nhớ (thay cho DataFrame ~32+ byte/rating)
+# Đầu vào : etl/intermediate/ratings.cleaned.parquet
+# Cách lưu:
+#   - rating lượng tử hoá thành uint8 nửa sao: 0.5–5.0 -> 1–10
+#     (rating không đúng bước 0.5, vd. từ dedup "mean", bị từ chối)
+#   - movie dense id int32, timestamp epoch giây uint32
+#   - dòng sort theo (user, timestamp) -> lát cắt theo user là 1 đoạn liên
+#     tiếp (indptr kiểu CSR, không cần lưu userId từng dòng)
+#   - lát cắt theo movie: hoán vị int32 + indptr, dựng lười khi cần
+#   - from_parquet: 2 lượt stream, ghi thẳng vào mảng gọn (counting sort
+#     theo user, mảng phụ chỉ theo max id) -> đỉnh bộ nhớ ~ kích thước cuối
+#   => ~9 byte/rating (+4 byte nếu dùng truy cập theo movie)
+# Dùng cho code mô hình (truy cập theo user / movie, ma trận CSR).
+# ------------------------------------------------------------
+
+from pathlib import Path
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+RATINGS_PATH = INTERMEDIATE / "ratings.cleaned.parquet"
+
+sys.path.insert(0, str(ROOT))
+from etl.transform.timestamps import epoch_seconds, arrow_epoch_seconds   # noqa: E402
+from etl.features.aggregate_stats import max_ids, new_accumulator, accumulate, to_table   # noqa: E402
+
+TS_MISSING = 0              # ts uint32: 0 = không có timestamp
+
+
+def quantize(rating: np.ndarray) -> np.ndarray:
+    """0.5–5.0 (bước 0.5) -> uint8 1–10; giá trị lệch bước -> ValueError (không làm tròn)."""
+    r2 = np.asarray(rating, dtype=np.float64) * 2
+    if len(r2) and (np.isnan(r2).any() or r2.min() < 1 or r2.max() > 10):
+        raise ValueError("rating phải nằm trong [0.5, 5.0]")
+    off_grid = np.count_nonzero(r2 != np.rint(r2))
+    if off_grid:
+        raise ValueError(f"{off_grid} rating không phải bội số 0.5 (vd. dedup 'mean') -> không lưu gọn được")
+    return r2.astype(np.uint8)
+
+
+def dequantize(q: np.ndarray) -> np.ndarray:
+    return q.astype(np.float32) / 2
+
+
+class CompactRatings:
+    """Ratings dạng mảng NumPy gọn, truy cập nhanh theo user hoặc theo movie."""
+
+    __slots__ = ("user_ids", "movie_ids", "user_indptr", "movie_idx", "rating_q", "ts",
+                 "_movie_indptr", "_movie_order")
+
+    def __init__(self, user_ids, movie_ids, user_indptr, movie_idx, rating_q, ts):
+        self.user_ids = user_ids            # int64 (n_users,)  dense id -> userId
+        self.movie_ids = movie_ids          # int64 (n_movies,) dense id -> movieId
+        self.user_indptr = user_indptr      # int64 (n_users+1,) đoạn dòng của từng user
+        self.movie_idx = movie_idx          # int32 (n,)
+        self.rating_q = rating_q            # uint8 (n,)
+        self.ts = ts                        # uint32 (n,) epoch giây, 0 = không có
+        self._movie_indptr = None
+        self._movie_order = None
+
+    # ============ DỰNG ============
+    @classmethod
+    def from_arrays(cls, user, movie, rating, ts=None):
+        """Dựng từ mảng id gốc + rating float + timestamp epoch giây (tuỳ chọn)."""
+        user = np.asarray(user, dtype=np.int64)
+        movie = np.asarray(movie, dtype=np.int64)
+        ts = np.zeros(len(user), dtype=np.int64) if ts is None else np.asarray(ts, dtype=np.int64)
+        _check_ts(ts)
+
+        user_ids, u_idx = np.unique(user, return_inverse=True)
+        movie_ids, m_idx = np.unique(movie, return_inverse=True)
+        order = np.lexsort((ts, u_idx))
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u_idx, minlength=len(user_ids)), out=indptr[1:])
+        return cls(user_ids, movie_ids, indptr, m_idx[order].astype(np.int32),
+                   quantize(np.asarray(rating)[order]), ts[order].astype(np.uint32))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        return cls.from_arrays(df["userId"].to_numpy(), df["movieId"].to_numpy(),
+                               df["rating"].to_numpy(), epoch_seconds(df["timestamp"], missing=TS_MISSING))
+
+    @classmethod
+    def from_parquet(cls, path: Path = RATINGS_PATH, batch_size: int = 1_000_000):
+        """
+        Đọc parquet theo batch, ghi thẳng vào mảng gọn (kết quả giống from_frame):
+        - Lượt 1 (chỉ 2 cột id): số rating mỗi user + movie có mặt -> dense id, indptr
+          (mảng phụ đánh chỉ số bằng id gốc, kích thước theo max id như aggregate_stats)
+        - Lượt 2: mỗi dòng ghi vào đoạn của user mình theo con trỏ ghi (counting sort,
+          giữ thứ tự file); rating lượng tử hoá 1 lần -> uint8, không đổi lại float
+        - Cuối: sort ổn định theo timestamp trong từng user, từng khối ~batch_size dòng
+        Bộ nhớ phụ chỉ phụ thuộc max id và batch_size.
+        """
+        if not Path(path).exists():
+            raise FileNotFoundError(f"Thiếu file: {path}")
+        pf = pq.ParquetFile(path)
+        max_user, max_movie = max_ids(pf)
+
+        user_count = np.zeros(max_user + 1, dtype=np.int64)
+        movie_seen = np.zeros(max_movie + 1, dtype=bool)
+        for batch in pf.iter_batches(batch_size=batch_size, columns=["userId", "movieId"]):
+            user_count += np.bincount(_ids(batch, "userId"), minlength=max_user + 1)
+            movie_seen[_ids(batch, "movieId")] = True
+        user_ids = np.flatnonzero(user_count)
+        movie_ids = np.flatnonzero(movie_seen)
+        movie_dense = np.full(max_movie + 1, -1, dtype=np.int32)
+        movie_dense[movie_ids] = np.arange(len(movie_ids), dtype=np.int32)
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(user_count[user_ids], out=indptr[1:])
+        del user_count, movie_seen
+
+        n = int(indptr[-1])
+        movie_idx = np.empty(n, dtype=np.int32)
+        rating_q = np.empty(n, dtype=np.uint8)
+        ts = np.empty(n, dtype=np.uint32)
+        cursor = np.zeros(max_user + 1, dtype=np.int64)      # vị trí ghi tiếp theo của từng user
+        cursor[user_ids] = indptr[:-1]
+        for batch in pf.iter_batches(batch_size=batch_size, columns=["userId", "movieId", "rating", "timestamp"]):
+            u = _ids(batch, "userId")
+            order = np.argsort(u, kind="stable")
+            su = u[order]
+            starts = np.flatnonzero(np.r_[True, su[1:] != su[:-1]])
+            counts = np.diff(np.r_[starts, len(su)])
+            dest = np.empty(len(u), dtype=np.int64)
+            dest[order] = cursor[su] + np.arange(len(su)) - np.repeat(starts, counts)
+            cursor[su[starts]] += counts
+
+            batch_ts = arrow_epoch_seconds(batch.column("timestamp"), missing=TS_MISSING)
+            _check_ts(batch_ts)
+            movie_idx[dest] = movie_dense[_ids(batch, "movieId")]
+            rating_q[dest] = quantize(batch.column("rating").to_numpy(zero_copy_only=False))
+            ts[dest] = batch_ts
+        del cursor, movie_dense
+
+        _sort_users_by_ts(indptr, movie_idx, rating_q, ts, batch_size)
+        return cls(user_ids, movie_ids, indptr, movie_idx, rating_q, ts)
+
+    # ============ TRUY CẬP ============
+    def __len__(self):
+        return len(self.rating_q)
+
+    @property
+    def nbytes(self) -> int:
+        extra = 0 if self._movie_order is None else self._movie_order.nbytes + self._movie_indptr.nbytes
+        return int(self.user_ids.nbytes + self.movie_ids.nbytes + self.user_indptr.nbytes
+                   + self.movie_idx.nbytes + self.rating_q.nbytes + self.ts.nbytes + extra)
+
+    def user_rows(self, dense_user: int) -> slice:
+        return slice(int(self.user_indptr[dense_user]), int(self.user_indptr[dense_user + 1]))
+
+    def user(self, user_id: int) -> pd.DataFrame:
+        """Lịch sử rating của 1 user (theo thời gian): movieId, rating, timestamp."""
+        i = np.searchsorted(self.user_ids, user_id)
+        if i >= len(self.user_ids) or self.user_ids[i] != user_id:
+            return _empty_slice("movieId")
+        s = self.user_rows(i)
+        return pd.DataFrame({
+            "movieId": self.movie_ids[self.movie_idx[s]],
+            "rating": dequantize(self.rating_q[s]),
+            "timestamp": _to_datetime(self.ts[s]),
+        })
+
+    def _build_movie_index(self):
+        """Hoán vị dòng theo movie (sort ổn định -> giữ thứ tự user, thời gian)."""
+        self._movie_order = np.argsort(self.movie_idx, kind="stable").astype(np.int32)
+        indptr = np.zeros(len(self.movie_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.movie_idx, minlength=len(self.movie_ids)), out=indptr[1:])
+        self._movie_indptr = indptr
+
+    def movie(self, movie_id: int) -> pd.DataFrame:
+        """Tất cả rating của 1 movie: userId, rating, timestamp."""
+        j = np.searchsorted(self.movie_ids, movie_id)
+        if j >= len(self.movie_ids) or self.movie_ids[j] != movie_id:
+            return _empty_slice("userId")
+        if self._movie_order is None:
+            self._build_movie_index()
+        rows = self._movie_order[self._movie_indptr[j]:self._movie_indptr[j + 1]]
+        dense_user = np.searchsorted(self.user_indptr, rows, side="right") - 1
+        return pd.DataFrame({
+            "userId": self.user_ids[dense_user],
+            "rating": dequantize(self.rating_q[rows]),
+            "timestamp": _to_datetime(self.ts[rows]),
+        })
+
+    def user_item_matrix(self) -> sp.csr_matrix:
+        """CSR user × movie (giá trị = rating float32), dùng chung indptr/indices."""
+        return sp.csr_matrix((dequantize(self.rating_q), self.movie_idx, self.user_indptr),
+                             shape=(len(self.user_ids), len(self.movie_ids)))
+
+    # ============ THỐNG KÊ ============
+    def movie_stats(self) -> pd.DataFrame:
+        """avg_rating / rating_count / rating_std (ddof=1, 1 rating -> 0) theo movie,
+        cùng phép tính aggregate_stats.to_table (rating nửa sao là giá trị chính xác)."""
+        acc = new_accumulator(len(self.movie_ids))
+        has_ts = self.ts != TS_MISSING
+        accumulate(acc, self.movie_idx, self.rating_q / 2.0, self.ts.astype(np.int64), has_ts)
+        stats = to_table(acc, "movieId")
+        stats["movieId"] = self.movie_ids[stats["movieId"].to_numpy()]
+        return stats[["movieId", "avg_rating", "rating_count", "rating_std"]]
+
+
+def _check_ts(ts: np.ndarray):
+    if len(ts) and (ts.min() < 0 or ts.max() > np.iinfo(np.uint32).max):
+        raise ValueError("timestamp ngoài khoảng uint32 (1970–2106)")
+
+
+def _ids(batch, col: str) -> np.ndarray:
+    return batch.column(col).to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+
+
+def _sort_users_by_ts(indptr, movie_idx, rating_q, ts, chunk_rows: int):
+    """Sort ổn định theo ts trong từng đoạn user (in-place), mỗi lần 1 khối user ~chunk_rows dòng."""
+    n_users = len(indptr) - 1
+    lo = 0
+    while lo < n_users:
+        hi = int(np.searchsorted(indptr, indptr[lo] + chunk_rows, side="right")) - 1
+        hi = min(max(hi, lo + 1), n_users)
+        a, b = indptr[lo], indptr[hi]
+        seg = np.repeat(np.arange(hi - lo, dtype=np.int32), np.diff(indptr[lo:hi + 1]))
+        order = np.lexsort((ts[a:b], seg))
+        movie_idx[a:b] = movie_idx[a:b][order]
+        rating_q[a:b] = rating_q[a:b][order]
+        ts[a:b] = ts[a:b][order]
+        lo = hi
+
+
+def _to_datetime(ts: np.ndarray) -> pd.DatetimeIndex:
+    """uint32 epoch giây -> datetime UTC; TS_MISSING -> NaT."""
+    return pd.to_datetime(ts.astype(np.int64), unit="s", utc=True).where(ts != TS_MISSING)
+
+
+def _empty_slice(key: str) -> pd.DataFrame:
+    return pd.DataFrame({key: np.zeros(0, dtype=np.int64), "rating": np.zeros(0, dtype=np.float32),
+                         "timestamp": pd.to_datetime(np.zeros(0, dtype=np.int64), unit="s", utc=True)})
+
+
+def main():
+    df = pd.read_parquet(RATINGS_PATH)
+    df_bytes = int(df.memory_usage(deep=True).sum())
+    compact = CompactRatings.from_parquet(RATINGS_PATH)
+    base = compact.nbytes
+    compact.movie(int(compact.movie_ids[0]))        # dựng index theo movie
+    print(f"[compact] {len(compact)} ratings")
+    print(f"[compact] DataFrame: {df_bytes / 1e6:.2f} MB ({df_bytes / len(df):.1f} B/rating)")
+    print(f"[compact] Compact  : {base / 1e6:.2f} MB ({base / len(compact):.1f} B/rating), "
+          f"+ index movie: {compact.nbytes / 1e6:.2f} MB ({compact.nbytes / len(compact):.1f} B/rating)")
+
+
+if __name__ == "__main__":
+    main()
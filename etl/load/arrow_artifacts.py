@@ -0,0 +1,134 @@
+# etl/load/arrow_artifacts.py
+# ------------------------------------------------------------
+# Trao đổi artifact giữa các bước ETL / notebook bằng Arrow IPC (Feather v2)
+# - Các transform + export_dataset có tuỳ chọn `publish_arrow` (hoặc cờ
+#   --arrow khi chạy script) để ghi thêm file .arrow KHÔNG nén cạnh
+#   file parquet / csv
+# - load_artifact() chọn định dạng nhanh nhất đang có:
+#     .arrow  -> pyarrow.memory_map, zero-copy (gần như tức thì)
+#     .parquet-> giải nén + decode
+#     .csv    -> parse text
+# - Benchmark thời gian đọc từng định dạng -> etl/reports/artifact_load_benchmark.csv
+# Ví dụ (notebook):
+#   from etl.load.arrow_artifacts import load_artifact
+#   df = load_artifact(ROOT / "etl" / "datasets" / "movie_features")
+# ------------------------------------------------------------
+
+from pathlib import Path
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+DATASETS = ROOT / "etl" / "datasets"
+REPORTS = ROOT / "etl" / "reports"
+BENCHMARK_CSV = REPORTS / "artifact_load_benchmark.csv"
+
+# Thứ tự ưu tiên: nhanh nhất trước
+FORMATS = (".arrow", ".parquet", ".csv")
+
+
+def arrow_path(path) -> Path:
+    """Đường dẫn .arrow tương ứng với file parquet/csv (cùng tên, khác đuôi)."""
+    return Path(path).with_suffix(".arrow")
+
+
+def write_arrow(df: pd.DataFrame, path) -> Path:
+    """Ghi DataFrame thành Arrow IPC không nén (mở được bằng memory_map)."""
+    out = arrow_path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    feather.write_feather(df.reset_index(drop=True), out, compression="uncompressed")
+    return out
+
+
+def read_arrow(path, columns=None, as_table: bool = False):
+    """Mở .arrow bằng memory map; as_table=True -> trả pa.Table (zero-copy hoàn toàn)."""
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select(columns)
+    return table if as_table else table.to_pandas()
+
+
+def find_artifact(stem) -> Path:
+    """Trả về file tồn tại đầu tiên theo thứ tự FORMATS cho `stem` (có/không đuôi)."""
+    stem = Path(stem)
+    base = stem.with_suffix("") if stem.suffix in FORMATS else stem
+    for ext in FORMATS:
+        candidate = base.with_name(base.name + ext)
+        if candidate.exists():
+            return candidate
+    raise FileNotFoundError(f"Không tìm thấy {base.name}{{{','.join(FORMATS)}}} trong {base.parent}")
+
+
+def load_artifact(stem, columns=None, as_table: bool = False):
+    """
+    Đọc artifact bằng định dạng nhanh nhất hiện có (.arrow > .parquet > .csv).
+    Lưu ý: .arrow chỉ được dùng khi không cũ hơn parquet/csv cùng tên.
+    """
+    path = find_artifact(stem)
+    if path.suffix == ".arrow":
+        newer = [p for p in (path.with_suffix(".parquet"), path.with_suffix(".csv"))
+                 if p.exists() and p.stat().st_mtime > path.stat().st_mtime]
+        if not newer:
+            return read_arrow(path, columns, as_table)
+        print(f"[arrow] ⚠️ {path.name} cũ hơn {newer[0].name}, dùng {newer[0].suffix}")
+        path = newer[0]
+
+    if path.suffix == ".parquet":
+        table = pq.read_table(path, columns=columns)
+        return table if as_table else table.to_pandas()
+    df = pd.read_csv(path, usecols=columns)
+    return pa.Table.from_pandas(df, preserve_index=False) if as_table else df
+
+
+# ============ BENCHMARK ============
+def _time_it(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def benchmark(repeat: int = 5) -> pd.DataFrame:
+    """Đo thời gian đọc (best of `repeat`) từng định dạng cho các artifact hiện có."""
+    stems = [INTERMEDIATE / f"{name}.cleaned" for name in ("movies", "ratings", "links")]
+    stems.append(DATASETS / "movie_features")
+
+    rows = []
+    for stem in stems:
+        for ext in FORMATS:
+            path = stem.with_name(stem.name + ext)
+            if not path.exists():
+                continue
+            if ext == ".arrow":
+                readers = {"arrow_mmap_table": lambda p=path: read_arrow(p, as_table=True),
+                           "arrow_mmap_pandas": lambda p=path: read_arrow(p)}
+            elif ext == ".parquet":
+                readers = {"parquet": lambda p=path: pd.read_parquet(p)}
+            else:
+                readers = {"csv": lambda p=path: pd.read_csv(p)}
+            for name, fn in readers.items():
+                rows.append({
+                    "artifact": stem.name,
+                    "format": name,
+                    "size_mb": round(path.stat().st_size / 1e6, 3),
+                    "load_ms": round(_time_it(fn, repeat) * 1000, 3),
+                })
+
+    df = pd.DataFrame(rows)
+    REPORTS.mkdir(parents=True, exist_ok=True)
+    df.to_csv(BENCHMARK_CSV, index=False, encoding="utf-8")
+    print(df.to_string(index=False))
+    print(f"[arrow] ✅ Wrote: {BENCHMARK_CSV}")
+    return df
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -3,11 +3,18 @@
 #   - Đọc dữ liệu cleaned từ etl/intermediate/*.parquet
 #   - Gộp thông tin ratings + movies + links
 #   - Tính trung bình, số lượng, độ lệch chuẩn rating theo movie
+#     (dùng sẵn etl/intermediate/movie_features.parquet nếu đã chạy
+#      etl/features/aggregate_stats.py; nếu không thì stream ratings qua
+#      aggregate_stats.movie_stats -> 2 nhánh cùng phép tính, cùng kết quả,
+#      không nạp toàn bộ ratings)
 #   - Lấy năm phát hành, thể loại đầu tiên làm label
 #   - Xuất thành CSV tại etl/datasets/movie_features.csv
+#     (+ movie_features.arrow nếu publish_arrow / cờ --arrow, đọc bằng
+#      etl/load/arrow_artifacts.load_artifact)
 # ------------------------------------------------------------
 
 from pathlib import Path
+import sys
 import pandas as pd
 import numpy as np
 
@@ -18,7 +25,12 @@ DATASETS = ROOT / "etl" / "datasets"
 DATASETS.mkdir(parents=True, exist_ok=True)
 OUTPUT = DATASETS / "movie_features.csv"
 
-def export_dataset():
+sys.path.insert(0, str(ROOT))
+from etl.features.aggregate_stats import movie_stats      # noqa: E402
+from etl.load.arrow_artifacts import write_arrow           # noqa: E402
+MOVIE_FEATURES = INTERMEDIATE / "movie_features.parquet"   # từ etl/features/aggregate_stats.py
+
+def export_dataset(publish_arrow=False):
     print("[load] Bắt đầu gộp dữ liệu từ parquet...")
 
     # 1️⃣ Đọc dữ liệu parquet
@@ -30,17 +42,21 @@ def export_dataset():
         raise FileNotFoundError("❌ Thiếu 1 trong 3 file parquet cần thiết (movies, ratings, links).")
 
     movies = pd.read_parquet(movies_path)
-    ratings = pd.read_parquet(ratings_path)
     links = pd.read_parquet(links_path)
 
-    print(f"[load] movies: {movies.shape}, ratings: {ratings.shape}, links: {links.shape}")
+    print(f"[load] movies: {movies.shape}, links: {links.shape}")
 
     # 2️⃣ Tính toán đặc trưng rating theo movieId
-    rating_stats = ratings.groupby("movieId").agg(
-        avg_rating=("rating", "mean"),
-        rating_count=("rating", "count"),
-        rating_std=("rating", "std")
-    ).reset_index()
+    # Ưu tiên bảng thống kê out-of-core (mới hơn ratings) -> không cần nạp ratings
+    if MOVIE_FEATURES.exists() and MOVIE_FEATURES.stat().st_mtime >= ratings_path.stat().st_mtime:
+        print(f"[load] Dùng thống kê có sẵn: {MOVIE_FEATURES}")
+        rating_stats = pd.read_parquet(
+            MOVIE_FEATURES, columns=["movieId", "avg_rating", "rating_count", "rating_std"]
+        )
+    else:
+        # Stream ratings theo batch, cộng dồn theo movieId (rating float gốc, không lượng tử hoá)
+        print(f"[load] Tính thống kê theo batch từ {ratings_path}")
+        rating_stats = movie_stats(ratings_path)[["movieId", "avg_rating", "rating_count", "rating_std"]]
 
     # Điền giá trị thiếu (std có thể bị NaN khi chỉ có 1 rating)
     rating_stats["rating_std"] = rating_stats["rating_std"].fillna(0)
@@ -153,7 +169,9 @@ def export_dataset():
     # 6️⃣ Ghi ra CSV
     merged.to_csv(OUTPUT, index=False, encoding="utf-8")
     print(f"[load] ✅ Xuất thành công -> {OUTPUT}")
+    if publish_arrow:
+        print(f"[load] ✅ Xuất Arrow IPC -> {write_arrow(merged, OUTPUT)}")
     print(f"[load] {merged.shape[0]} dòng, {merged.shape[1]} cột")
 
 if __name__ == "__main__":
-    export_dataset()
\ No newline at end of file
+    export_dataset(publish_arrow="--arrow" in sys.argv)
\ No newline at end of file
@@ -0,0 +1,189 @@
+# etl/models/collaborative.py
+# ------------------------------------------------------------
+# Mô hình collaborative filtering cơ bản: Item-kNN và ALS (implicit)
+# Đầu vào : mảng train đã mã hoá dense id (user_idx, item_idx, rating)
+#           + bảng ánh xạ dense id -> userId / movieId
+# Cả hai mô hình dùng được làm recommender cho
+# etl/evaluate/evaluate_recs.py: model(user_ids, k) -> (len, k) movieId, -1 = trống
+# Ghi chú hiệu năng:
+#   - Item-kNN: ma trận tương đồng tính theo block cột, chỉ giữ top-N
+#     láng giềng mỗi item (CSR thưa)
+#   - ALS: giải hệ chuẩn tắc cho cả batch user cùng lúc
+#     (Gram qua matmul trên tensor pad theo độ dài + np.linalg.solve theo batch)
+# ------------------------------------------------------------
+
+from abc import ABC, abstractmethod
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+
+
+# ============ DỮ LIỆU TRAIN DẠNG DENSE ID ============
+def encode_ratings(train: pd.DataFrame):
+    """
+    DataFrame (userId, movieId, rating) -> dict mảng dense id:
+    user_ids/item_ids (id gốc, sorted) + user_idx/item_idx int32 + rating float32.
+    """
+    user_ids, user_idx = np.unique(train["userId"].to_numpy(dtype=np.int64), return_inverse=True)
+    item_ids, item_idx = np.unique(train["movieId"].to_numpy(dtype=np.int64), return_inverse=True)
+    return {
+        "user_ids": user_ids,
+        "item_ids": item_ids,
+        "user_idx": user_idx.astype(np.int32),
+        "item_idx": item_idx.astype(np.int32),
+        "rating": train["rating"].to_numpy(dtype=np.float32),
+    }
+
+
+def _user_item_csr(data: dict) -> sp.csr_matrix:
+    shape = (len(data["user_ids"]), len(data["item_ids"]))
+    X = sp.csr_matrix((data["rating"], (data["user_idx"], data["item_idx"])), shape=shape, dtype=np.float32)
+    X.sum_duplicates()
+    return X
+
+
+class _Recommender(ABC):
+    """Phần chung: ánh xạ userId -> dense id, loại phim đã xem, lấy top-K."""
+
+    def _fit_common(self, data: dict):
+        self.user_ids = np.asarray(data["user_ids"])
+        self.item_ids = np.asarray(data["item_ids"])
+        self.seen = _user_item_csr(data)
+        return self
+
+    @abstractmethod
+    def _scores(self, rows: np.ndarray) -> np.ndarray:
+        """Ma trận điểm (len(rows), n_items) cho các user dense id `rows`."""
+
+    def __call__(self, user_ids, k):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        out = np.full((len(user_ids), k), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+        known = self.user_ids[pos] == user_ids
+        if not known.any():
+            return out
+
+        rows = pos[known]
+        scores = self._scores(rows)
+        # Loại phim đã xem trong train
+        seen = self.seen[rows]
+        scores[np.repeat(np.arange(len(rows)), np.diff(seen.indptr)), seen.indices] = -np.inf
+
+        kk = min(k, scores.shape[1])
+        top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        valid = np.isfinite(np.take_along_axis(top_scores, order, axis=1))
+        out[np.flatnonzero(known), :kk] = np.where(valid, self.item_ids[top], -1)
+        return out
+
+
+# ============ ITEM-KNN ============
+class ItemKNN(_Recommender):
+    """
+    Item-kNN cosine có shrink: sim(i,j) = <xi,xj> / (|xi||xj| + shrink).
+    Chỉ giữ `n_neighbors` láng giềng lớn nhất mỗi item.
+    """
+
+    def __init__(self, n_neighbors: int = 50, shrink: float = 10.0, block_size: int = 1024):
+        self.n_neighbors = n_neighbors
+        self.shrink = shrink
+        self.block_size = block_size
+
+    def fit(self, data: dict):
+        self._fit_common(data)
+        X = self.seen.tocsc()
+        n_items = X.shape[1]
+        norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=0)).ravel())
+        XT = X.T.tocsr()
+        k = min(self.n_neighbors, max(n_items - 1, 1))
+
+        rows, cols, vals = [], [], []
+        for lo in range(0, n_items, self.block_size):
+            hi = min(lo + self.block_size, n_items)
+            sims = (XT[lo:hi] @ X).toarray()
+            sims /= norms[lo:hi, None] * norms[None, :] + self.shrink + 1e-9
+            sims[np.arange(hi - lo), np.arange(lo, hi)] = 0.0
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            rows.append(np.repeat(np.arange(lo, hi), k))
+            cols.append(top.ravel())
+            vals.append(np.take_along_axis(sims, top, axis=1).ravel())
+
+        # W[i, j]: mức đóng góp của item i đã xem cho item j
+        self.W = sp.csr_matrix(
+            (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(n_items, n_items), dtype=np.float32,
+        )
+        return self
+
+    def _scores(self, rows):
+        return np.asarray((self.seen[rows] @ self.W).todense(), dtype=np.float32)
+
+
+# ============ ALS ============
+class ALS(_Recommender):
+    """
+    ALS cho implicit feedback (Hu, Koren & Volinsky 2008):
+    preference = 1 với phim đã rating, confidence c = 1 + alpha·rating.
+    """
+
+    def __init__(self, factors: int = 32, reg: float = 0.1, alpha: float = 10.0,
+                 iterations: int = 10, seed: int = 42, batch_nnz: int = 65_536):
+        self.factors = factors
+        self.reg = reg
+        self.alpha = alpha
+        self.iterations = iterations
+        self.seed = seed
+        self.batch_nnz = batch_nnz
+
+    def _solve(self, C: sp.csr_matrix, fixed: np.ndarray) -> np.ndarray:
+        """
+        Giải x_u = (YᵀY + Yᵀ(C_u − I)Y + λI)⁻¹ YᵀC_u p_u cho mọi dòng của C
+        (C.data = confidence − 1). Dòng được sort theo số nnz rồi gom batch
+        cùng độ dài, pad thành tensor (B, L, f) để tính Gram bằng matmul
+        theo batch; B·L ≤ batch_nnz nên bộ nhớ mỗi batch cố định.
+        """
+        n_rows, f = C.shape[0], fixed.shape[1]
+        Y = fixed.astype(np.float64)
+        base = Y.T @ Y + self.reg * np.eye(f)
+        out = np.zeros((n_rows, f), dtype=np.float32)
+        counts = np.diff(C.indptr)
+        order = np.argsort(counts, kind="stable")
+        sorted_counts = counts[order]
+
+        i = int(np.searchsorted(sorted_counts, 1))        # dòng rỗng -> x = 0
+        while i < n_rows:
+            guess = min(i + self.batch_nnz // max(sorted_counts[i], 1), n_rows)
+            step = max(1, self.batch_nnz // max(int(sorted_counts[guess - 1]), 1))
+            rows = order[i:min(i + step, n_rows)]
+            L = int(counts[rows].max())
+
+            offs = np.arange(L)
+            mask = offs[None, :] < counts[rows, None]
+            idx = np.where(mask, C.indptr[rows, None] + offs[None, :], 0)
+            V = Y[C.indices[idx]] * mask[..., None]
+            w = np.where(mask, C.data[idx], 0.0)
+
+            gram = np.matmul((V * w[..., None]).transpose(0, 2, 1), V)
+            rhs = np.einsum("bl,blf->bf", (1.0 + w) * mask, V)
+            out[rows] = np.linalg.solve(base + gram, rhs[..., None])[..., 0]
+            i += len(rows)
+        return out
+
+    def fit(self, data: dict):
+        self._fit_common(data)
+        C = self.seen.copy()
+        C.data = self.alpha * C.data
+        CT = C.T.tocsr()
+
+        rng = np.random.default_rng(self.seed)
+        self.U = (rng.standard_normal((C.shape[0], self.factors)) * 0.01).astype(np.float32)
+        self.V = (rng.standard_normal((C.shape[1], self.factors)) * 0.01).astype(np.float32)
+        for _ in range(self.iterations):
+            self.U = self._solve(C, self.V)
+            self.V = self._solve(CT, self.U)
+        return self
+
+    def _scores(self, rows):
+        return self.U[rows] @ self.V.T
@@ -0,0 +1,322 @@
+# etl/models/popularity.py
+# ------------------------------------------------------------
+# Baseline phổ biến (popularity) & xu hướng (trending) cho user mới (cold-start)
+# Đầu vào : etl/intermediate/ratings.cleaned.parquet
+#           etl/intermediate/movies.cleaned.parquet
+# Đầu ra  : etl/intermediate/popularity_state.npz      (bộ đếm đã cộng dồn)
+#           etl/datasets/popularity_rankings.parquet   (top-N theo thể loại)
+# Nội dung:
+#   - Chia ratings theo bucket thời gian (day/week) từ timestamp cleaned,
+#     gom thành bảng thưa (bucket × movie) gồm count/sum
+#   - Cộng dồn tăng dần: các bucket đã "đóng" được gộp vào state; lần
+#     build sau chỉ đọc lại ratings từ bucket mới nhất (bucket mở) trở đi
+#   - State ghi kích thước/mtime của ratings.cleaned.parquet + checksum vùng
+#     đã đóng; file bị ghi lại (vd. đổi dedup policy) mà vùng đã đóng khác
+#     checksum -> build lại từ đầu
+#   - Điểm Bayesian weighted rating + điểm trending giảm dần theo hàm mũ
+#   - Ranking tính sẵn theo thể loại -> lấy top-N chỉ là cắt mảng
+# ------------------------------------------------------------
+
+from pathlib import Path
+import sys
+import pandas as pd
+import numpy as np
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+DATASETS = ROOT / "etl" / "datasets"
+DATASETS.mkdir(parents=True, exist_ok=True)
+
+RATINGS_PATH = INTERMEDIATE / "ratings.cleaned.parquet"
+MOVIES_PATH = INTERMEDIATE / "movies.cleaned.parquet"
+STATE_PATH = INTERMEDIATE / "popularity_state.npz"
+RANKINGS_PATH = DATASETS / "popularity_rankings.parquet"
+
+BUCKET_SECONDS = {"day": 86_400, "week": 7 * 86_400}
+ALL_GENRES = "__all__"      # khoá ranking tổng (không lọc thể loại)
+
+sys.path.insert(0, str(ROOT))
+from etl.transform.timestamps import epoch_seconds   # noqa: E402
+
+
+# ============ BUCKET HOÁ ============
+def bucketize(ratings: pd.DataFrame, granularity: str = "week"):
+    """
+    Gom ratings thành bảng thưa (bucket, movieId, count, sum), sort theo (bucket, movieId).
+    bucket = số ngày/tuần tính từ epoch -> ổn định giữa các lần build.
+    """
+    ratings = ratings.dropna(subset=["timestamp"])
+    step = BUCKET_SECONDS[granularity]
+    bucket = epoch_seconds(ratings["timestamp"]) // step
+    movie = ratings["movieId"].to_numpy(dtype=np.int64)
+    rating = ratings["rating"].to_numpy(dtype=np.float64)
+
+    # Khoá đóng gói (bucket, movieId) -> unique + bincount, không groupby
+    span = int(movie.max(initial=0)) + 1
+    keys = bucket * span + movie
+    uniq, inv = np.unique(keys, return_inverse=True)
+    return {
+        "bucket": uniq // span,
+        "movieId": uniq % span,
+        "count": np.bincount(inv, minlength=len(uniq)).astype(np.int64),
+        "sum": np.bincount(inv, weights=rating, minlength=len(uniq)),
+    }
+
+
+# ============ STATE CỘNG DỒN ============
+def _empty_state(granularity: str, half_life: float) -> dict:
+    return {
+        "movie_ids": np.zeros(0, dtype=np.int64),
+        "count": np.zeros(0, dtype=np.int64),       # tổng số rating (bucket đã đóng)
+        "sum": np.zeros(0, dtype=np.float64),       # tổng điểm rating (bucket đã đóng)
+        "decay": np.zeros(0, dtype=np.float64),     # count giảm dần, quy về closed_through
+        "closed_through": np.int64(-1),             # bucket đóng cuối cùng đã gộp
+        # checksum vùng đã đóng: [số rating, tổng epoch giây] + tổng điểm rating
+        "closed_checksum": np.zeros(2, dtype=np.int64),
+        "closed_rating_sum": np.float64(0.0),
+        "source": np.zeros(2, dtype=np.int64),      # [size, mtime_ns] của ratings lúc build
+        "granularity": granularity,
+        "half_life": float(half_life),
+    }
+
+
+def load_state(path: Path = STATE_PATH):
+    """Đọc state đã lưu; trả về None nếu chưa có."""
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as z:
+        state = {k: z[k] for k in z.files}
+    state["granularity"] = str(state["granularity"])
+    state["half_life"] = float(state["half_life"])
+    return state
+
+
+def save_state(state: dict, path: Path = STATE_PATH):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **state)
+
+
+def _align(state: dict, movie_ids: np.ndarray) -> dict:
+    """Mở rộng các mảng của state khi xuất hiện movieId mới."""
+    all_ids = np.union1d(state["movie_ids"], movie_ids)
+    if len(all_ids) == len(state["movie_ids"]):
+        return state
+    pos = np.searchsorted(all_ids, state["movie_ids"])
+    for key, dtype in (("count", np.int64), ("sum", np.float64), ("decay", np.float64)):
+        grown = np.zeros(len(all_ids), dtype=dtype)
+        grown[pos] = state[key]
+        state[key] = grown
+    state["movie_ids"] = all_ids
+    return state
+
+
+def _decay_factor(age, half_life: float):
+    """Hệ số giảm dần 2^(-age/half_life), age tính bằng số bucket."""
+    return np.exp2(-np.asarray(age, dtype=np.float64) / half_life)
+
+
+def _accumulate(state: dict, table: dict, through: int, rows: np.ndarray):
+    """Cộng các dòng `rows` của bảng bucket vào mảng theo movie, decay quy về bucket `through`."""
+    idx = np.searchsorted(state["movie_ids"], table["movieId"][rows])
+    n = len(state["movie_ids"])
+    weights = table["count"][rows] * _decay_factor(through - table["bucket"][rows], state["half_life"])
+    count = np.bincount(idx, weights=table["count"][rows], minlength=n).astype(np.int64)
+    total = np.bincount(idx, weights=table["sum"][rows], minlength=n)
+    decay = np.bincount(idx, weights=weights, minlength=n)
+    return count, total, decay
+
+
+def update_state(state: dict, ratings: pd.DataFrame):
+    """
+    Gộp ratings mới (chỉ gồm bucket > closed_through) vào state.
+    - Bucket < bucket mới nhất -> đóng lại, gộp hẳn vào state
+    - Bucket mới nhất (còn mở, có thể nhận thêm rating) -> chỉ trả về
+      để tính điểm, KHÔNG lưu vào state (lần sau sẽ đọc lại)
+    Trả về (state, open_arrays) với open_arrays = (count, sum) theo movie.
+    """
+    table = bucketize(ratings, state["granularity"])
+    state = _align(state, table["movieId"])
+    n = len(state["movie_ids"])
+    if len(table["bucket"]) == 0:
+        return state, (np.zeros(n, dtype=np.int64), np.zeros(n)), int(state["closed_through"])
+
+    newest = int(table["bucket"].max())
+    closing = np.flatnonzero(table["bucket"] < newest)
+
+    # Checksum các rating rơi vào bucket sắp đóng (để phát hiện file bị ghi lại)
+    ratings = ratings.dropna(subset=["timestamp"])
+    secs = epoch_seconds(ratings["timestamp"])
+    closed_rows = secs // BUCKET_SECONDS[state["granularity"]] < newest
+    state["closed_checksum"] = state["closed_checksum"] + np.array(
+        [closed_rows.sum(), secs[closed_rows].sum()], dtype=np.int64)
+    state["closed_rating_sum"] = np.float64(
+        state["closed_rating_sum"] + ratings["rating"].to_numpy(dtype=np.float64)[closed_rows].sum())
+    opening = np.flatnonzero(table["bucket"] == newest)
+
+    if len(closing):
+        through = newest - 1
+        count, total, decay = _accumulate(state, table, through, closing)
+        old_through = int(state["closed_through"])
+        carry = _decay_factor(through - old_through, state["half_life"]) if old_through >= 0 else 0.0
+        state["count"] = state["count"] + count
+        state["sum"] = state["sum"] + total
+        state["decay"] = state["decay"] * carry + decay
+        state["closed_through"] = np.int64(through)
+
+    open_count, open_sum, _ = _accumulate(state, table, newest, opening)
+    return state, (open_count, open_sum), newest
+
+
+def _source_fingerprint(path: Path = RATINGS_PATH) -> np.ndarray:
+    st = path.stat()
+    return np.array([st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def _closed_region_matches(state: dict, path: Path = RATINGS_PATH) -> bool:
+    """
+    Ratings đã bị ghi lại: kiểm tra vùng đã đóng (timestamp < bucket mở) còn khớp
+    checksum trong state không. Chỉ đọc 2 cột rating/timestamp, không bucket hoá.
+    """
+    since = pd.Timestamp((int(state["closed_through"]) + 1) * BUCKET_SECONDS[state["granularity"]],
+                         unit="s", tz="UTC")
+    closed = pd.read_parquet(path, columns=["rating", "timestamp"], filters=[("timestamp", "<", since)])
+    closed = closed.dropna(subset=["timestamp"])
+    checksum = np.array([len(closed), epoch_seconds(closed["timestamp"]).sum()], dtype=np.int64)
+    return bool(np.array_equal(checksum, state["closed_checksum"])
+                and np.isclose(closed["rating"].sum(), state["closed_rating_sum"], rtol=1e-12, atol=1e-6))
+
+
+# ============ ĐIỂM SỐ ============
+def compute_scores(state: dict, open_arrays, newest: int, min_votes_quantile: float = 0.8) -> pd.DataFrame:
+    """
+    - bayes_score: WR = v/(v+m)·R + m/(v+m)·C
+      (v = số rating, R = trung bình phim, C = trung bình toàn cục,
+       m = phân vị `min_votes_quantile` của số rating)
+    - trend_score: tổng count giảm dần theo hàm mũ, quy về bucket mới nhất
+    """
+    open_count, open_sum = open_arrays
+    count = state["count"] + open_count
+    total = state["sum"] + open_sum
+
+    has = count > 0
+    avg = np.divide(total, count, out=np.zeros(len(count)), where=has)
+    global_mean = total.sum() / max(count.sum(), 1)
+    m = float(np.quantile(count[has], min_votes_quantile)) if has.any() else 0.0
+    bayes = (count * avg + m * global_mean) / np.maximum(count + m, 1e-9)
+
+    through = int(state["closed_through"])
+    carry = _decay_factor(newest - through, state["half_life"]) if through >= 0 else 0.0
+    trend = state["decay"] * carry + open_count
+
+    return pd.DataFrame({
+        "movieId": state["movie_ids"],
+        "rating_count": count,
+        "avg_rating": avg,
+        "bayes_score": bayes,
+        "trend_score": trend,
+    })[has]
+
+
+def build_rankings(scores: pd.DataFrame, movies: pd.DataFrame, top_n: int = 100) -> pd.DataFrame:
+    """Tính sẵn top-N theo thể loại (và tổng `__all__`) cho từng loại điểm."""
+    genres = movies[["movieId", "genres_list"]].explode("genres_list").dropna()
+    genres = genres.rename(columns={"genres_list": "genre"})
+    allrows = pd.DataFrame({"movieId": scores["movieId"], "genre": ALL_GENRES})
+    pairs = pd.concat([allrows, genres], ignore_index=True).merge(scores, on="movieId", how="inner")
+
+    parts = []
+    for kind in ("bayes_score", "trend_score"):
+        ranked = (
+            pairs.sort_values(["genre", kind, "rating_count"], ascending=[True, False, False], kind="stable")
+            .groupby("genre", sort=False).head(top_n)
+        )
+        ranked = ranked.assign(kind=kind.replace("_score", ""), score=ranked[kind])
+        ranked["rank"] = ranked.groupby("genre").cumcount() + 1
+        parts.append(ranked[["kind", "genre", "rank", "movieId", "score"]])
+    return pd.concat(parts, ignore_index=True)
+
+
+# ============ TRA CỨU O(1) ============
+class PopularityRanking:
+    """
+    Ranking đã tính sẵn: top(genre, n) chỉ là tra dict + cắt mảng.
+    Dùng được như recommender cho etl/evaluate/evaluate_recs.py (mọi user nhận cùng list).
+    """
+
+    def __init__(self, rankings: pd.DataFrame):
+        rankings = rankings.sort_values(["kind", "genre", "rank"])
+        self._index = {
+            key: grp["movieId"].to_numpy(dtype=np.int64)
+            for key, grp in rankings.groupby(["kind", "genre"], sort=False)
+        }
+
+    @classmethod
+    def load(cls, path: Path = RANKINGS_PATH):
+        if not path.exists():
+            raise FileNotFoundError(f"Thiếu file: {path} (chạy build_popularity() trước)")
+        return cls(pd.read_parquet(path))
+
+    def top(self, genre: str = ALL_GENRES, n: int = 10, kind: str = "bayes") -> np.ndarray:
+        return self._index.get((kind, genre), np.zeros(0, dtype=np.int64))[:n]
+
+    def __call__(self, user_ids, k):
+        top = self.top(n=k)
+        out = np.full((len(user_ids), k), -1, dtype=np.int64)
+        out[:, :len(top)] = top
+        return out
+
+
+# ============ MAIN ============
+def build_popularity(granularity: str = "week", half_life: float = 4.0,
+                     top_n: int = 100, full: bool = False) -> pd.DataFrame:
+    """
+    Build (hoặc cập nhật tăng dần) state + rankings.
+    full=True, đổi granularity/half_life, hoặc ratings bị ghi lại làm vùng
+    đã đóng thay đổi -> build lại từ đầu.
+    """
+    if not RATINGS_PATH.exists() or not MOVIES_PATH.exists():
+        raise FileNotFoundError("❌ Thiếu ratings.cleaned.parquet hoặc movies.cleaned.parquet")
+
+    state = None if full else load_state()
+    if state is not None and (state["granularity"] != granularity or state["half_life"] != half_life):
+        print("[popularity] Cấu hình bucket thay đổi -> build lại từ đầu")
+        state = None
+    if state is not None and "source" not in state:
+        print("[popularity] State cũ (chưa có checksum) -> build lại từ đầu")
+        state = None
+    source = _source_fingerprint()
+    if (state is not None and int(state["closed_through"]) >= 0
+            and not np.array_equal(state["source"], source) and not _closed_region_matches(state)):
+        print("[popularity] ratings.cleaned.parquet đã bị ghi lại (vùng đã đóng thay đổi) -> build lại từ đầu")
+        state = None
+
+    columns = ["movieId", "rating", "timestamp"]
+    if state is None or int(state["closed_through"]) < 0:
+        state = _empty_state(granularity, half_life)
+        ratings = pd.read_parquet(RATINGS_PATH, columns=columns)
+        print(f"[popularity] Full build: {len(ratings)} ratings")
+    else:
+        # Chỉ đọc ratings từ bucket chưa đóng trở đi (pushdown filter xuống parquet)
+        since = pd.Timestamp((int(state["closed_through"]) + 1) * BUCKET_SECONDS[granularity], unit="s", tz="UTC")
+        ratings = pd.read_parquet(RATINGS_PATH, columns=columns, filters=[("timestamp", ">=", since)])
+        print(f"[popularity] Incremental build từ {since}: {len(ratings)} ratings mới")
+
+    state, open_arrays, newest = update_state(state, ratings)
+    state["source"] = source
+    save_state(state)
+
+    scores = compute_scores(state, open_arrays, newest)
+    movies = pd.read_parquet(MOVIES_PATH, columns=["movieId", "genres_list"])
+    rankings = build_rankings(scores, movies, top_n=top_n)
+    rankings.to_parquet(RANKINGS_PATH, index=False)
+
+    print(f"[popularity] movies có điểm: {len(scores)}, "
+          f"thể loại: {rankings['genre'].nunique()}, rows ranking: {len(rankings)}")
+    print(f"[popularity] ✅ Wrote: {STATE_PATH}")
+    print(f"[popularity] ✅ Wrote: {RANKINGS_PATH}")
+    return rankings
+
+
+if __name__ == "__main__":
+    build_popularity()
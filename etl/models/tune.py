@@ -0,0 +1,247 @@
+# etl/models/tune.py
+# ------------------------------------------------------------
+# Tìm siêu tham số cho recommender (ItemKNN, ALS) thay cho GridSearchCV
+# Đầu vào : etl/intermediate/ratings.cleaned.parquet
+# Đầu ra  : etl/reports/tuning_trials.jsonl   (log từng trial, chạy tiếp được)
+#           etl/intermediate/tuning_cache/    (split + mảng train dùng chung)
+# Cách làm:
+#   - Random search hoặc successive halving: nhiều cấu hình chạy ở
+#     budget nhỏ (tỉ lệ user), giữ 1/eta tốt nhất lên rung tiếp theo
+#   - Trial chạy song song trên process pool
+#   - Tiền xử lý dùng chung (temporal split, dense id) chỉ tính 1 lần và
+#     lưu .npy; worker mở bằng np.load(mmap_mode="r") thay vì tự đọc parquet
+#   - Trial đã có trong file log được bỏ qua -> chạy lại là "resume"
+# ------------------------------------------------------------
+
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import sys
+import os
+import json
+import time
+import hashlib
+import pandas as pd
+import numpy as np
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+REPORTS = ROOT / "etl" / "reports"
+REPORTS.mkdir(parents=True, exist_ok=True)
+
+RATINGS_PATH = INTERMEDIATE / "ratings.cleaned.parquet"
+CACHE_ROOT = INTERMEDIATE / "tuning_cache"
+TRIALS_PATH = REPORTS / "tuning_trials.jsonl"
+
+sys.path.insert(0, str(ROOT))
+from etl.evaluate.evaluate_recs import temporal_split, evaluate       # noqa: E402
+from etl.models.collaborative import ItemKNN, ALS                     # noqa: E402
+
+MODELS = {"ItemKNN": ItemKNN, "ALS": ALS}
+
+# Không gian tìm kiếm: (kiểu, tham số)
+SEARCH_SPACE = {
+    "ItemKNN": {
+        "n_neighbors": ("int_log", 10, 400),
+        "shrink": ("float", 0.0, 100.0),
+    },
+    "ALS": {
+        "factors": ("choice", [16, 32, 64, 128]),
+        "reg": ("float_log", 1e-3, 10.0),
+        "alpha": ("float_log", 1.0, 50.0),
+        "iterations": ("int", 5, 15),
+    },
+}
+
+CACHE_ARRAYS = ["user_ids", "item_ids", "user_idx", "item_idx", "rating",
+                "user_rank", "test_user", "test_movie"]
+
+
+# ============ CACHE TIỀN XỬ LÝ ============
+def _cache_key(path: Path, n_last: int) -> str:
+    st = path.stat()
+    raw = f"{path.name}:{st.st_size}:{int(st.st_mtime)}:leave_last_{n_last}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:12]
+
+
+def build_cache(path: Path = RATINGS_PATH, n_last: int = 5) -> Path:
+    """Split + mã hoá dense id 1 lần, lưu từng mảng thành .npy (worker mmap)."""
+    if not path.exists():
+        raise FileNotFoundError(f"Thiếu file: {path}")
+    cache_dir = CACHE_ROOT / _cache_key(path, n_last)
+    if all((cache_dir / f"{name}.npy").exists() for name in CACHE_ARRAYS):
+        print(f"[tune] Dùng cache: {cache_dir}")
+        return cache_dir
+
+    ratings = pd.read_parquet(path, columns=["userId", "movieId", "rating", "timestamp"])
+    train, test = temporal_split(ratings, mode="leave_last", n=n_last)
+
+    user_ids, user_idx = np.unique(train["userId"].to_numpy(dtype=np.int64), return_inverse=True)
+    item_ids, item_idx = np.unique(train["movieId"].to_numpy(dtype=np.int64), return_inverse=True)
+    # Thứ tự ngẫu nhiên cố định của user -> budget = lấy user có rank < frac·N
+    user_rank = np.random.default_rng(0).permutation(len(user_ids)).astype(np.int32)
+
+    arrays = {
+        "user_ids": user_ids,
+        "item_ids": item_ids,
+        "user_idx": user_idx.astype(np.int32),
+        "item_idx": item_idx.astype(np.int32),
+        "rating": train["rating"].to_numpy(dtype=np.float32),
+        "user_rank": user_rank,
+        "test_user": test["userId"].to_numpy(dtype=np.int64),
+        "test_movie": test["movieId"].to_numpy(dtype=np.int64),
+    }
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for name, arr in arrays.items():
+        np.save(cache_dir / f"{name}.npy", arr)
+    print(f"[tune] Wrote cache: {cache_dir} (train {len(train)}, test {len(test)})")
+    return cache_dir
+
+
+def load_cache(cache_dir: Path, budget: float = 1.0):
+    """Mở cache bằng memmap; budget < 1 -> chỉ lấy tập con user (cả train lẫn test)."""
+    a = {name: np.load(cache_dir / f"{name}.npy", mmap_mode="r") for name in CACHE_ARRAYS}
+    n_users = len(a["user_ids"])
+    keep_user = np.asarray(a["user_rank"]) < max(1, int(round(budget * n_users)))
+
+    train_mask = keep_user[a["user_idx"]]
+    data = {
+        "user_ids": a["user_ids"],
+        "item_ids": a["item_ids"],
+        "user_idx": a["user_idx"][train_mask],
+        "item_idx": a["item_idx"][train_mask],
+        "rating": a["rating"][train_mask],
+    }
+    pos = np.minimum(np.searchsorted(a["user_ids"], a["test_user"]), n_users - 1)
+    test_mask = (a["user_ids"][pos] == a["test_user"]) & keep_user[pos]
+    test = pd.DataFrame({"userId": a["test_user"][test_mask], "movieId": a["test_movie"][test_mask]})
+    return data, test
+
+
+# ============ LẤY MẪU THAM SỐ ============
+def sample_params(space: dict, rng: np.random.Generator) -> dict:
+    params = {}
+    for name, spec in space.items():
+        kind = spec[0]
+        if kind == "choice":
+            params[name] = spec[1][int(rng.integers(len(spec[1])))]
+        elif kind == "int":
+            params[name] = int(rng.integers(spec[1], spec[2] + 1))
+        elif kind == "int_log":
+            params[name] = int(round(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2])))))
+        elif kind == "float":
+            params[name] = round(float(rng.uniform(spec[1], spec[2])), 4)
+        elif kind == "float_log":
+            params[name] = round(float(np.exp(rng.uniform(np.log(spec[1]), np.log(spec[2])))), 6)
+        else:
+            raise ValueError(f"Kiểu tham số không hỗ trợ: {kind}")
+    return params
+
+
+def _trial_id(model: str, params: dict, budget: float, cache_dir: Path, k: int) -> str:
+    raw = json.dumps([model, params, round(budget, 4), cache_dir.name, k], sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+# ============ CHẠY TRIAL ============
+def run_trial(cache_dir: str, model: str, params: dict, budget: float, k: int = 10) -> dict:
+    """Worker: train + đánh giá 1 cấu hình ở 1 budget (evaluate chạy tuần tự trong worker)."""
+    t0 = time.perf_counter()
+    data, test = load_cache(Path(cache_dir), budget)
+    rec = MODELS[model](**params).fit(data)
+    t1 = time.perf_counter()
+    metrics = evaluate(rec, test, k=k, catalog_size=len(data["item_ids"]), n_workers=1)
+    return {"fit_seconds": round(t1 - t0, 3), "eval_seconds": round(time.perf_counter() - t1, 3), **metrics}
+
+
+def load_trials(path: Path = TRIALS_PATH) -> dict:
+    """Đọc log trial (JSONL) -> {trial_id: record}; bỏ qua dòng hỏng (ghi dở)."""
+    done = {}
+    if path.exists():
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                rec = json.loads(line)
+                done[rec["trial_id"]] = rec
+            except (json.JSONDecodeError, KeyError):
+                continue
+    return done
+
+
+def _run_rung(cache_dir: Path, model: str, configs: list, budget: float, k: int,
+              n_workers: int, done: dict) -> list:
+    """Chạy 1 rung: trial đã có trong log thì dùng lại, còn lại đẩy vào pool."""
+    results, pending = [], []
+    for params in configs:
+        tid = _trial_id(model, params, budget, cache_dir, k)
+        if tid in done:
+            results.append(done[tid])
+        else:
+            pending.append((tid, params))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=n_workers) as ex, open(TRIALS_PATH, "a", encoding="utf-8") as log:
+            futures = {ex.submit(run_trial, str(cache_dir), model, params, budget, k): (tid, params)
+                       for tid, params in pending}
+            for fut in as_completed(futures):
+                tid, params = futures[fut]
+                rec = {"trial_id": tid, "model": model, "params": params, "budget": round(budget, 4),
+                       "cache": cache_dir.name, "k": k, **fut.result()}
+                log.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                log.flush()
+                done[tid] = rec
+                results.append(rec)
+                print(f"[tune] {model} budget={budget:.3f} {params} -> ndcg@{k}={rec[f'ndcg@{k}']:.4f}")
+    return results
+
+
+# ============ SEARCH ============
+def search(model: str, n_configs: int = 9, mode: str = "halving", eta: int = 3, min_budget: float = 1 / 9,
+           k: int = 10, metric: str = None, n_workers: int = None, seed: int = 42, n_last: int = 5) -> dict:
+    """
+    mode="random" : n_configs cấu hình, chạy hết ở budget 1
+    mode="halving": successive halving, budget min_budget·eta^r tới 1, giữ top 1/eta mỗi rung
+    Trả về record tốt nhất ở budget cao nhất.
+    """
+    if model not in SEARCH_SPACE:
+        raise ValueError(f"Model không hỗ trợ: {model}")
+    metric = metric or f"ndcg@{k}"
+    n_workers = n_workers or os.cpu_count() or 1
+    cache_dir = build_cache(n_last=n_last)
+    done = load_trials()
+
+    rng = np.random.default_rng(seed)
+    configs = [sample_params(SEARCH_SPACE[model], rng) for _ in range(n_configs)]
+
+    if mode == "random":
+        budgets = [1.0]
+    elif mode == "halving":
+        budgets, b = [], min_budget
+        while b < 1.0 - 1e-9:
+            budgets.append(b)
+            b *= eta
+        budgets.append(1.0)
+    else:
+        raise ValueError(f"mode không hợp lệ: {mode}")
+
+    results = []
+    for rung, budget in enumerate(budgets):
+        results = _run_rung(cache_dir, model, configs, budget, k, n_workers, done)
+        results.sort(key=lambda r: r[metric], reverse=True)
+        if rung < len(budgets) - 1:
+            keep = max(1, len(results) // eta)
+            configs = [r["params"] for r in results[:keep]]
+            print(f"[tune] {model}: rung {rung} (budget {budget:.3f}) -> giữ {keep}/{len(results)}")
+
+    best = results[0]
+    print(f"[tune] ✅ {model} best {metric}={best[metric]:.4f} params={best['params']}")
+    return best
+
+
+def main():
+    best = [search(name) for name in SEARCH_SPACE]
+    print(f"[tune] Trials log: {TRIALS_PATH}")
+    print(pd.DataFrame(best)[["model", "params", "ndcg@10", "map@10", "coverage", "fit_seconds"]])
+
+
+if __name__ == "__main__":
+    main()
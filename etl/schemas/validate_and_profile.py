@@ -22,6 +22,7 @@ REPORTS.mkdir(parents=True, exist_ok=True)
 
 VALIDATION_JSON = REPORTS / "validation_report.json"
 PROFILE_CSV = REPORTS / "profile_summary.csv"
+DEDUP_JSON = REPORTS / "ratings_dedup.json"   # do transform/ratings.py ghi ra
 
 # ============ CÔNG CỤ HỖ TRỢ ============
 def safe_read_parquet(path: Path) -> pd.DataFrame:
@@ -242,6 +243,11 @@ def main():
     ratings_rep = validate_ratings(ratings)
     links_rep = validate_links(links)
 
+    # Số dòng trùng (userId, movieId) đã được gộp ở bước clean_ratings (nếu có)
+    if DEDUP_JSON.exists():
+        with open(DEDUP_JSON, encoding="utf-8") as f:
+            ratings_rep["dedup"] = json.load(f)
+
     validation_report = {
         "generated_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC"),
         "movies.cleaned": movies_rep,
@@ -0,0 +1,271 @@
+# etl/serving/mongo_reader.py
+# ------------------------------------------------------------
+# Lớp đọc dữ liệu bất đồng bộ (asyncio) cho MongoDB phục vụ gợi ý
+# Collections (do etl/load/load_to_mongo.py nạp):
+#   movies  : {movieId, title_clean, year, genres_list}
+#   ratings : {userId, movieId, rating, timestamp}
+#   links   : {movieId, imdbId_tt, tmdbId}
+# Nội dung:
+#   - pymongo chạy trong thread pool riêng (không chặn event loop),
+#     1 MongoClient dùng chung (connection pool của driver)
+#   - Tra nhiều movieId trong 1 query `$in` (chia batch), có projection
+#   - Cache đọc xuyên (read-through) có TTL cho movies / links / lịch sử user;
+#     id không tồn tại cũng được cache (kết quả rỗng) để không hỏi lại Mongo;
+#     kết quả trả về là bản sao -> caller sửa thoải mái, không làm hỏng cache
+#   - Nhận bất kỳ object "giống database" (db[name].find / find_one)
+#     -> test được với InMemoryDB bên dưới, không cần Mongo thật
+# Cấu hình: MONGO_URI, MONGO_DB trong .env (mặc định localhost / movierec)
+# Benchmark: python etl/serving/mongo_reader.py  (batch $in vs find_one từng id)
+# ------------------------------------------------------------
+
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import copy
+import os
+import time
+import pandas as pd
+
+# --------- Đường dẫn & cấu hình ---------
+ROOT = Path(__file__).resolve().parents[2]
+INTERMEDIATE = ROOT / "etl" / "intermediate"
+
+DEFAULT_URI = "mongodb://localhost:27017"
+DEFAULT_DB = "movierec"
+
+_NOT_FOUND = object()       # giá trị cache cho id không có document
+
+
+# ============ CACHE TTL ============
+class TTLCache:
+    """Cache LRU có hạn dùng (giây); hết hạn hoặc vượt maxsize thì bị loại."""
+
+    def __init__(self, ttl: float = 60.0, maxsize: int = 10_000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+# ============ READER ============
+def _projection(key: str, fields):
+    """fields=None -> lấy hết (trừ _id); luôn giữ trường khoá để ghép kết quả."""
+    if fields is None:
+        return {"_id": 0}
+    return {"_id": 0, key: 1, **{f: 1 for f in fields}}
+
+
+class AsyncMongoReader:
+    """
+    Đọc movies / links / lịch sử rating theo batch, không chặn event loop.
+    db: object kiểu pymongo Database (hoặc InMemoryDB); None -> tự kết nối theo .env
+    """
+
+    def __init__(self, db=None, uri: str = None, db_name: str = None, max_workers: int = 8,
+                 batch_size: int = 1000, cache_ttl: float = 60.0, cache_size: int = 10_000):
+        self._client = None
+        if db is None:
+            db = self._connect(uri, db_name, max_workers)
+        self.db = db
+        self.batch_size = batch_size
+        self.cache = TTLCache(cache_ttl, cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mongo-read")
+
+    def _connect(self, uri, db_name, max_workers):
+        from dotenv import load_dotenv
+        from pymongo import MongoClient
+
+        load_dotenv()
+        uri = uri or os.getenv("MONGO_URI", DEFAULT_URI)
+        db_name = db_name or os.getenv("MONGO_DB", DEFAULT_DB)
+        # maxPoolSize >= số thread để mỗi thread có sẵn kết nối
+        self._client = MongoClient(uri, maxPoolSize=max(max_workers, 10))
+        return self._client[db_name]
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _find(self, collection: str, query: dict, projection: dict):
+        return list(self.db[collection].find(query, projection))
+
+    async def _find_in(self, collection: str, key: str, ids, fields=None) -> list:
+        """Query `$in` theo batch_size id, các batch chạy song song."""
+        projection = _projection(key, fields)
+        chunks = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        parts = await asyncio.gather(*(
+            self._run(self._find, collection, {key: {"$in": chunk}}, projection) for chunk in chunks
+        ))
+        return [doc for part in parts for doc in part]
+
+    async def _cached_lookup(self, collection: str, key: str, ids, fields=None, many: bool = False) -> dict:
+        """
+        Read-through: id có trong cache thì trả luôn, phần còn lại gom 1 lần `$in`.
+        many=True -> mỗi id ứng với list document (vd. lịch sử rating của user).
+        Id không tìm thấy được cache là _NOT_FOUND (many=True: list rỗng) với cùng TTL.
+        """
+        ids = list(dict.fromkeys(int(i) for i in ids))        # bỏ trùng, giữ thứ tự
+        tag = tuple(fields) if fields is not None else None
+        out, missing = {}, []
+        for i in ids:
+            hit = self.cache.get((collection, i, tag))
+            if hit is None:
+                missing.append(i)
+            elif hit is not _NOT_FOUND:
+                out[i] = copy.deepcopy(hit)
+
+        if missing:
+            docs = await self._find_in(collection, key, missing, fields)
+            fetched = {i: [] for i in missing} if many else {}
+            for doc in docs:
+                if many:
+                    fetched[doc[key]].append(doc)
+                else:
+                    fetched[doc[key]] = doc
+            for i in missing:
+                self.cache.set((collection, i, tag), fetched.get(i, _NOT_FOUND))
+            out.update(copy.deepcopy(fetched))
+        return out
+
+    async def get_movies(self, movie_ids, fields=None) -> dict:
+        """{movieId: document} cho các movieId tồn tại."""
+        return await self._cached_lookup("movies", "movieId", movie_ids, fields)
+
+    async def get_links(self, movie_ids, fields=None) -> dict:
+        return await self._cached_lookup("links", "movieId", movie_ids, fields)
+
+    async def get_user_histories(self, user_ids, fields=("movieId", "rating", "timestamp")) -> dict:
+        """{userId: [rating documents]}; user không có rating -> list rỗng."""
+        return await self._cached_lookup("ratings", "userId", user_ids, fields, many=True)
+
+    async def find_one_movie(self, movie_id: int, fields=None):
+        """Đọc 1 phim bằng find_one (không cache) — dùng để so sánh trong benchmark."""
+        return await self._run(self.db["movies"].find_one, {"movieId": int(movie_id)},
+                               _projection("movieId", fields))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self._client is not None:
+            self._client.close()
+
+
+def ensure_indexes(db):
+    """Index cần cho các truy vấn `$in` ở trên (chạy 1 lần sau khi load)."""
+    db["movies"].create_index("movieId", unique=True)
+    db["links"].create_index("movieId", unique=True)
+    db["ratings"].create_index([("userId", 1), ("movieId", 1)])
+
+
+# ============ STAND-IN CHO TEST / BENCHMARK ============
+class InMemoryCollection:
+    """
+    Collection giả lập trong RAM: hỗ trợ find({key: v | {"$in": [...]}}, projection)
+    và find_one. `latency` (giây) mô phỏng 1 round-trip mạng cho mỗi lời gọi.
+    """
+
+    def __init__(self, docs, latency: float = 0.0):
+        self.docs = list(docs)
+        self.latency = latency
+        self.calls = 0
+        self._index = {}
+
+    def _by(self, key):
+        if key not in self._index:
+            idx = {}
+            for doc in self.docs:
+                idx.setdefault(doc.get(key), []).append(doc)
+            self._index[key] = idx
+        return self._index[key]
+
+    @staticmethod
+    def _project(doc, projection):
+        if not projection or set(projection) == {"_id"}:
+            return {k: v for k, v in doc.items() if k != "_id"}
+        return {k: doc[k] for k, on in projection.items() if on and k != "_id" and k in doc}
+
+    def find(self, query, projection=None):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        (key, cond), = query.items()
+        values = cond["$in"] if isinstance(cond, dict) else [cond]
+        idx = self._by(key)
+        return [self._project(d, projection) for v in values for d in idx.get(v, [])]
+
+    def find_one(self, query, projection=None):
+        docs = self.find(query, projection)
+        return docs[0] if docs else None
+
+
+class InMemoryDB(dict):
+    """db["movies"] -> InMemoryCollection."""
+
+    @classmethod
+    def from_intermediate(cls, latency: float = 0.0):
+        """Dựng stand-in từ parquet cleaned (cùng dạng document với load_to_mongo)."""
+        db = cls()
+        for name in ("movies", "ratings", "links"):
+            df = pd.read_parquet(INTERMEDIATE / f"{name}.cleaned.parquet")
+            if "genres_list" in df.columns:
+                df["genres_list"] = df["genres_list"].map(list)
+            df = df.astype(object).where(df.notna(), None)
+            db[name] = InMemoryCollection(df.to_dict("records"), latency)
+        return db
+
+
+# ============ BENCHMARK ============
+async def _benchmark(reader: AsyncMongoReader, movie_ids, fields):
+    t0 = time.perf_counter()
+    naive = await asyncio.gather(*(reader.find_one_movie(i, fields) for i in movie_ids))
+    t1 = time.perf_counter()
+    reader.cache.clear()
+    batched = await reader.get_movies(movie_ids, fields)
+    t2 = time.perf_counter()
+    cached = await reader.get_movies(movie_ids, fields)
+    t3 = time.perf_counter()
+    assert sum(d is not None for d in naive) == len(batched) == len(cached)
+    return {"find_one_each": t1 - t0, "batched_in": t2 - t1, "cached": t3 - t2}
+
+
+def benchmark(n_ids: int = 500, latency: float = 0.002, use_mongo: bool = False):
+    """So sánh find_one từng id vs `$in` theo batch vs cache (mặc định trên InMemoryDB)."""
+    db = None if use_mongo else InMemoryDB.from_intermediate(latency=latency)
+    reader = AsyncMongoReader(db=db)
+    try:
+        movie_ids = pd.read_parquet(INTERMEDIATE / "movies.cleaned.parquet", columns=["movieId"])["movieId"]
+        movie_ids = movie_ids.sample(min(n_ids, len(movie_ids)), random_state=42).tolist()
+        timings = asyncio.run(_benchmark(reader, movie_ids, ["title_clean", "year"]))
+    finally:
+        reader.close()
+
+    source = "MongoDB" if use_mongo else f"InMemoryDB (latency {latency * 1000:.1f} ms/round-trip)"
+    print(f"[serving] {len(movie_ids)} movieId, nguồn: {source}")
+    for name, sec in timings.items():
+        print(f"[serving]   {name:<14} {sec * 1000:8.1f} ms")
+    return timings
+
+
+if __name__ == "__main__":
+    benchmark(use_mongo=bool(os.getenv("MONGO_URI")))
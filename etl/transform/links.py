@@ -1,21 +1,28 @@
+import sys
 import pandas as pd
 from pathlib import Path
 import re
 
-def clean_links():
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+from etl.transform.raw_reader import read_raw  # noqa: E402
+from etl.load.arrow_artifacts import write_arrow  # noqa: E402
+
+def clean_links(publish_arrow=False):
     """
     Làm sạch dữ liệu links.csv
     - Chuẩn hoá imdbId thành định dạng tt#######
     - Giữ các cột: movieId, imdbId_tt, tmdbId
     - Đảm bảo movieId là duy nhất
     - Không loại bỏ dòng thiếu tmdbId
+    - publish_arrow=True: ghi thêm links.cleaned.arrow (Arrow IPC không nén)
     """
 
     raw_path = Path("etl/raw/links.csv")
     out_path = Path("etl/intermediate/links.cleaned.parquet")
 
-    # Đọc dữ liệu gốc
-    df = pd.read_csv(raw_path)
+    # Đọc dữ liệu gốc (tmdbId đọc thẳng thành Int64)
+    df = read_raw("links", raw_dir=raw_path.parent)
 
     # Đảm bảo movieId là số nguyên
     df["movieId"] = pd.to_numeric(df["movieId"], errors="coerce").astype("Int64")
@@ -49,6 +56,8 @@ def clean_links():
     # --- Ghi ra file parquet ---
     out_path.parent.mkdir(parents=True, exist_ok=True)
     df.to_parquet(out_path, index=False)
+    if publish_arrow:
+        print("✅ links.cleaned.arrow saved:", write_arrow(df, out_path))
 
     # --- Kiểm thử nhanh ---
     print("✅ links.cleaned.parquet saved:", out_path)
@@ -60,4 +69,4 @@ def clean_links():
         df["imdbId_tt"].dropna().apply(lambda x: bool(re.fullmatch(r"tt\d{7,8}", x))).all())
 
 if __name__ == "__main__":
-    clean_links()
\ No newline at end of file
+    clean_links(publish_arrow="--arrow" in sys.argv)
\ No newline at end of file
@@ -1,13 +1,20 @@
 import re
+import sys
 import pandas as pd
 from pathlib import Path
 
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+from etl.transform.raw_reader import read_raw  # noqa: E402
+from etl.load.arrow_artifacts import write_arrow  # noqa: E402
 
-def clean_movies():
+
+def clean_movies(publish_arrow=False):
     """
     Làm sạch dữ liệu movies.csv
     - Tách title và year
     - Chuyển genres thành danh sách
+    - publish_arrow=True: ghi thêm movies.cleaned.arrow (Arrow IPC không nén)
     """
     # Đường dẫn file
     raw_path = "etl/raw/movies.csv"
@@ -15,7 +22,7 @@ def clean_movies():
     
     # Đọc dữ liệu
     print(f"Đọc dữ liệu từ: {raw_path}")
-    df = pd.read_csv(raw_path)
+    df = read_raw("movies", raw_dir=Path(raw_path).parent)
     print(f"Số dòng ban đầu: {len(df)}")
     
     # Loại bỏ duplicate movieId
@@ -78,10 +85,13 @@ def clean_movies():
     # Lưu file Parquet
     print(f"\n Lưu dữ liệu vào: {out_path}")
     df_clean.to_parquet(out_path, index=False)
+    if publish_arrow:
+        arrow_out = write_arrow(df_clean, out_path)
+        print(f" Lưu thêm Arrow IPC: {arrow_out}")
     print(" Hoàn thành!")
     
     return df_clean
 
 
 if __name__ == "__main__":
-    clean_movies()
\ No newline at end of file
+    clean_movies(publish_arrow="--arrow" in sys.argv)
\ No newline at end of file
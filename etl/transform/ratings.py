@@ -1,18 +1,24 @@
+import sys
+import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
-def clean_ratings():
-    """
-    Làm sạch dữ liệu ratings.csv
-    - Chuyển kiểu dữ liệu
-    - Lọc rating hợp lệ
-    - Chuyển timestamp sang datetime
-    """
-    raw_path = Path("etl/raw/ratings.csv")
-    out_path = Path("etl/intermediate/ratings.cleaned.parquet")
+ROOT = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(ROOT))
+from etl.transform.raw_reader import read_raw, iter_raw  # noqa: E402
+from etl.load.arrow_artifacts import write_arrow  # noqa: E402
 
-    # Đọc file CSV
-    df = pd.read_csv(raw_path)
+# Chính sách xử lý trùng (userId, movieId):
+#   latest -> giữ dòng có timestamp mới nhất
+#   first  -> giữ dòng xuất hiện đầu tiên trong file
+#   mean   -> rating = trung bình các dòng trùng, timestamp của dòng mới nhất
+DEDUP_POLICIES = ("latest", "first", "mean")
+
+
+def _prepare_chunk(df, offset=0):
+    """Làm sạch 1 phần dữ liệu (timestamp vẫn là epoch), gắn vị trí gốc `_pos`."""
+    df = df.assign(_pos=np.arange(offset, offset + len(df), dtype=np.int64))
 
     # Loại bỏ dòng có NaN ở userId hoặc movieId
     df = df.dropna(subset=["userId", "movieId"])
@@ -24,6 +30,97 @@ def clean_ratings():
     # Lọc rating hợp lệ
     df = df[(df["rating"] >= 0.5) & (df["rating"] <= 5.0)]
     df["rating"] = df["rating"].astype(float)
+    return df
+
+
+def dedup_ratings(df, policy="latest", finalize=True):
+    """
+    Gộp các dòng trùng (userId, movieId) theo `policy`, không dùng groupby/drop_duplicates:
+    - Khoá đóng gói int64: userId << 32 | movieId
+    - 1 lần sort ổn định (lexsort theo khoá, rồi timestamp với latest/mean)
+    - Ranh giới nhóm = vị trí khoá thay đổi -> chọn dòng đầu / cuối mỗi nhóm
+    Với policy="mean", tổng và số dòng được mang theo ở cột `_sum`/`_count`
+    để gộp tiếp giữa các chunk; finalize=True thì tính rating trung bình và bỏ 2 cột đó.
+    Kết quả giữ thứ tự dòng gốc (theo `_pos` nếu có).
+    """
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f"dedup policy không hợp lệ: {policy} (chọn {DEDUP_POLICIES})")
+    n = len(df)
+    if n == 0:
+        return df
+
+    users = df["userId"].to_numpy(dtype=np.int64)
+    movies = df["movieId"].to_numpy(dtype=np.int64)
+    # Khoá chỉ đúng khi id nằm gọn trong 31/32 bit, nếu không các cặp khác nhau sẽ trùng khoá
+    if users.min() < 0 or users.max() >= 2 ** 31 or movies.min() < 0 or movies.max() >= 2 ** 32:
+        raise ValueError("userId phải trong [0, 2^31) và movieId trong [0, 2^32) để đóng gói khoá")
+    key = (users << 32) | movies
+    if policy == "first":
+        # df đang theo thứ tự gốc -> sort ổn định giữ dòng đầu tiên lên trước
+        order = np.argsort(key, kind="stable")
+    else:
+        ts = pd.to_numeric(df["timestamp"], errors="coerce").fillna(-1).to_numpy(dtype=np.int64)
+        order = np.lexsort((ts, key))
+
+    sorted_key = key[order]
+    starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    pick = order[starts] if policy == "first" else order[ends]
+
+    if policy == "mean":
+        sums = df["_sum"].to_numpy(dtype=np.float64) if "_sum" in df else df["rating"].to_numpy(dtype=np.float64)
+        counts = df["_count"].to_numpy(dtype=np.int64) if "_count" in df else np.ones(n, dtype=np.int64)
+        group_sum = np.add.reduceat(sums[order], starts)
+        group_count = np.add.reduceat(counts[order], starts)
+
+    # Trả về theo thứ tự dòng gốc
+    keep = np.argsort(pick, kind="stable")
+    out = df.iloc[pick[keep]].copy()
+    if policy == "mean":
+        out["_sum"] = group_sum[keep]
+        out["_count"] = group_count[keep]
+        if finalize:
+            out["rating"] = out["_sum"] / out["_count"]
+            out = out.drop(columns=["_sum", "_count"])
+    return out
+
+
+def clean_ratings(publish_arrow=False, dedup_policy="latest", stream=False, block_size=1 << 24):
+    """
+    Làm sạch dữ liệu ratings.csv
+    - Chuyển kiểu dữ liệu
+    - Lọc rating hợp lệ
+    - Gộp trùng (userId, movieId) theo dedup_policy ("latest" | "first" | "mean")
+    - Chuyển timestamp sang datetime
+    - stream=True: đọc theo block, gộp trùng từng chunk rồi gộp lần cuối giữa các chunk
+    - publish_arrow=True: ghi thêm ratings.cleaned.arrow (Arrow IPC không nén)
+    """
+    raw_path = Path("etl/raw/ratings.csv")
+    out_path = Path("etl/intermediate/ratings.cleaned.parquet")
+    dedup_path = Path("etl/reports/ratings_dedup.json")
+
+    if stream:
+        # Mỗi chunk: làm sạch + gộp trùng cục bộ; cuối cùng gộp trùng xuyên chunk
+        parts, offset, rows_valid = [], 0, 0
+        for chunk in iter_raw("ratings", raw_dir=raw_path.parent, block_size=block_size):
+            part = _prepare_chunk(chunk, offset)
+            offset += len(chunk)
+            rows_valid += len(part)
+            parts.append(dedup_ratings(part, dedup_policy, finalize=False))
+        df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+            columns=["userId", "movieId", "rating", "timestamp", "_pos"])
+        rows_in = offset
+    else:
+        # Đọc file CSV (schema khai báo sẵn, pyarrow đa luồng)
+        df = read_raw("ratings", raw_dir=raw_path.parent)
+        rows_in = len(df)
+        df = _prepare_chunk(df)
+        rows_valid = len(df)
+
+    df = dedup_ratings(df, dedup_policy)
+    removed = rows_valid - len(df)
+    print(f"Gộp trùng (userId, movieId) [{dedup_policy}]: loại {removed} dòng, còn {len(df)}")
+    df = df.drop(columns=["_pos"]).reset_index(drop=True)
 
     # Chuyển timestamp epoch -> datetime UTC (nếu lỗi => NaT)
     def convert_timestamp(ts):
@@ -37,6 +134,20 @@ def clean_ratings():
     # Ghi ra file parquet
     out_path.parent.mkdir(parents=True, exist_ok=True)
     df.to_parquet(out_path, index=False)
+    if publish_arrow:
+        print("✅ ratings.cleaned.arrow saved:", write_arrow(df, out_path))
+
+    # Thống kê gộp trùng -> validate_and_profile đưa vào validation_report.json
+    dedup_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(dedup_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "policy": dedup_policy,
+            "stream": bool(stream),
+            "rows_in": int(rows_in),
+            "rows_after_filter": int(rows_valid),
+            "duplicate_rows_removed": int(removed),
+            "rows_out": int(len(df)),
+        }, f, indent=2, ensure_ascii=False)
 
     # In thông tin kiểm tra nhanh
     print("✅ ratings.cleaned.parquet saved:", out_path)
@@ -47,4 +158,5 @@ def clean_ratings():
 
 
 if __name__ == "__main__":
-    clean_ratings()
+    policy = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--dedup=")), "latest")
+    clean_ratings(publish_arrow="--arrow" in sys.argv, dedup_policy=policy, stream="--stream" in sys.argv)
@@ -0,0 +1,181 @@
+# etl/transform/raw_reader.py
+# ------------------------------------------------------------
+# Đọc CSV gốc (etl/raw) cho các transform: movies, ratings, links
+# - Schema khai báo sẵn cho từng file (kiểu cột + cột cần đọc) -> không
+#   phải đoán kiểu, tmdbId đọc thẳng thành Int64 (không qua float64)
+# - Parse bằng pyarrow.csv đa luồng, chỉ đọc các cột cần thiết
+# - Đọc được file nén trực tiếp: <name>.csv.gz / .csv.bz2, hoặc <name>.csv
+#   nằm trong 1 file .zip bất kỳ ở etl/raw (vd. ml-latest-small.zip), không
+#   cần giải nén (đọc streaming qua zf.open, không bung cả file vào RAM)
+# - In tốc độ đọc (MB/s, tính theo số byte trên đĩa) cho từng file
+# - iter_raw(): đọc streaming theo block (bộ nhớ cố định) cho file lớn
+# - Nếu pyarrow không parse được (dữ liệu bẩn) -> quay về pd.read_csv,
+#   vẫn ép kiểu theo schema (tmdbId vẫn là Int64)
+# ------------------------------------------------------------
+
+from pathlib import Path
+from contextlib import contextmanager
+import time
+import zipfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# --------- Đường dẫn ---------
+ROOT = Path(__file__).resolve().parents[2]
+RAW = ROOT / "etl" / "raw"
+
+# --------- Schema từng file ---------
+SCHEMAS = {
+    "movies": {
+        "movieId": pa.int64(),
+        "title": pa.string(),
+        "genres": pa.string(),
+    },
+    "ratings": {
+        "userId": pa.int64(),
+        "movieId": pa.int64(),
+        "rating": pa.float64(),
+        "timestamp": pa.int64(),
+    },
+    "links": {
+        "movieId": pa.int64(),
+        "imdbId": pa.string(),      # giữ nguyên chuỗi (có số 0 đầu)
+        "tmdbId": pa.int64(),       # có thể thiếu -> Int64 nullable
+    },
+}
+
+COMPRESSED_SUFFIXES = (".csv", ".csv.gz", ".csv.bz2")
+FALLBACK_CHUNK_ROWS = 1_000_000     # iter_raw đọc bằng pandas: số dòng mỗi chunk
+
+
+def locate_raw(name: str, raw_dir: Path = RAW):
+    """
+    Tìm file nguồn cho `name`: ưu tiên .csv, rồi .csv.gz/.csv.bz2, rồi thành viên
+    `<name>.csv` trong các file .zip. Trả về (path, member|None).
+    """
+    for suffix in COMPRESSED_SUFFIXES:
+        path = raw_dir / f"{name}{suffix}"
+        if path.exists():
+            return path, None
+    for zpath in sorted(raw_dir.glob("*.zip")):
+        with zipfile.ZipFile(zpath) as zf:
+            for member in zf.namelist():
+                if Path(member).name == f"{name}.csv":
+                    return zpath, member
+    raise FileNotFoundError(f"Không tìm thấy {name}.csv (.gz/.bz2/.zip) trong {raw_dir}")
+
+
+@contextmanager
+def _open_source(path: Path, member):
+    """
+    Yield (nguồn cho pyarrow / pandas, số byte trên đĩa để tính MB/s).
+    Thành viên .zip được mở dạng file streaming (giải nén dần khi đọc).
+    """
+    if member is None:
+        # pyarrow / pandas tự nhận dạng nén theo đuôi file (.gz, .bz2)
+        yield str(path), path.stat().st_size
+        return
+    with zipfile.ZipFile(path) as zf:
+        with zf.open(member) as f:
+            yield f, zf.getinfo(member).compress_size
+
+
+def _apply_schema(df: pd.DataFrame, schema: dict, columns) -> pd.DataFrame:
+    """Ép kiểu DataFrame đọc bằng pandas theo schema (giá trị bẩn -> thiếu)."""
+    for col in columns:
+        if schema[col] == pa.int64():
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+            if not df[col].hasnans:
+                df[col] = df[col].astype("int64")
+        elif schema[col] == pa.float64():
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    return df
+
+
+def _read_pandas(source, schema: dict, columns) -> pd.DataFrame:
+    dtype = {c: str for c in columns if schema[c] == pa.string()}
+    return _apply_schema(pd.read_csv(source, usecols=columns, dtype=dtype), schema, columns)
+
+
+def read_raw(name: str, columns=None, raw_dir: Path = RAW) -> pd.DataFrame:
+    """
+    Đọc file raw `name` ("movies" | "ratings" | "links") theo schema khai báo.
+    columns: tập con cột cần đọc (mặc định: mọi cột trong schema).
+    """
+    if name not in SCHEMAS:
+        raise ValueError(f"Không có schema cho: {name}")
+    schema = SCHEMAS[name]
+    columns = list(columns) if columns is not None else list(schema)
+
+    path, member = locate_raw(name, raw_dir)
+    label = f"{path.name}:{member}" if member else path.name
+    t0 = time.perf_counter()
+    try:
+        with _open_source(path, member) as (source, n_bytes):
+            table = pacsv.read_csv(
+                source,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=1 << 22),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={c: schema[c] for c in columns},
+                    include_columns=columns,
+                ),
+            )
+        # Cột int có giá trị thiếu -> Int64 nullable thay vì float64
+        df = table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+        for col in columns:
+            if schema[col] == pa.int64() and table.column(col).null_count == 0:
+                df[col] = df[col].astype("int64")
+    except pa.ArrowInvalid as e:
+        print(f"[raw] ⚠️ {label}: pyarrow không parse được ({e}); dùng pandas")
+        with _open_source(path, member) as (source, n_bytes):
+            df = _read_pandas(source, schema, columns)
+
+    sec = time.perf_counter() - t0
+    mb = n_bytes / 1e6
+    print(f"[raw] {label}: {len(df)} dòng, {mb:.2f} MB trong {sec:.3f}s ({mb / max(sec, 1e-9):.1f} MB/s)")
+    return df
+
+
+def iter_raw(name: str, columns=None, raw_dir: Path = RAW, block_size: int = 1 << 24):
+    """
+    Đọc streaming file raw `name` theo block ~block_size byte, yield từng DataFrame.
+    Cùng schema / nguồn nén như read_raw; in tổng MB/s khi đọc xong.
+    pyarrow lỗi parse (kể cả giữa chừng) -> đọc tiếp bằng pd.read_csv theo chunk
+    từ dòng chưa yield, ép kiểu theo schema như read_raw.
+    """
+    if name not in SCHEMAS:
+        raise ValueError(f"Không có schema cho: {name}")
+    schema = SCHEMAS[name]
+    columns = list(columns) if columns is not None else list(schema)
+
+    path, member = locate_raw(name, raw_dir)
+    label = f"{path.name}:{member}" if member else path.name
+    t0 = time.perf_counter()
+    n_rows = 0
+    try:
+        with _open_source(path, member) as (source, n_bytes):
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(use_threads=True, block_size=block_size),
+                convert_options=pacsv.ConvertOptions(
+                    column_types={c: schema[c] for c in columns},
+                    include_columns=columns,
+                ),
+            )
+            for batch in reader:
+                n_rows += batch.num_rows
+                yield batch.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    except pa.ArrowInvalid as e:
+        print(f"[raw] ⚠️ {label}: pyarrow không parse được ({e}); đọc tiếp bằng pandas từ dòng {n_rows}")
+        dtype = {c: str for c in columns if schema[c] == pa.string()}
+        with _open_source(path, member) as (source, n_bytes):
+            chunks = pd.read_csv(source, usecols=columns, dtype=dtype, chunksize=FALLBACK_CHUNK_ROWS,
+                                 skiprows=range(1, n_rows + 1))
+            for chunk in chunks:
+                n_rows += len(chunk)
+                yield _apply_schema(chunk, schema, columns)
+
+    sec = time.perf_counter() - t0
+    mb = n_bytes / 1e6
+    print(f"[raw] {label} (stream): {n_rows} dòng, {mb:.2f} MB trong {sec:.3f}s ({mb / max(sec, 1e-9):.1f} MB/s)")
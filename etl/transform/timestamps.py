@@ -0,0 +1,34 @@
+# etl/transform/timestamps.py
+# ------------------------------------------------------------
+# Đổi cột timestamp của ratings.cleaned.parquet (datetime UTC do
+# clean_ratings ghi ra, hoặc epoch số) sang epoch giây int64
+# Dùng chung cho evaluate / models / features -> 1 quy ước duy nhất:
+#   - giá trị thiếu (NaT / null / không parse được) -> MISSING_TS (-1),
+#     trừ khi caller truyền `missing` khác (vd. 0 cho mảng uint32)
+# ------------------------------------------------------------
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+MISSING_TS = -1
+
+
+def epoch_seconds(ts: pd.Series, missing: int = MISSING_TS) -> np.ndarray:
+    """pd.Series datetime (naive = UTC, hoặc tz-aware) hoặc epoch số -> int64 giây."""
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        is_missing = ts.isna().to_numpy()
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+        out = ts.to_numpy(dtype="datetime64[ns]").astype("datetime64[s]").astype(np.int64)
+        out[is_missing] = missing
+        return out
+    return pd.to_numeric(ts, errors="coerce").fillna(missing).to_numpy(dtype=np.int64)
+
+
+def arrow_epoch_seconds(col, missing: int = MISSING_TS) -> np.ndarray:
+    """Cột pyarrow (timestamp bất kỳ đơn vị, hoặc số nguyên epoch giây) -> int64 giây."""
+    if pa.types.is_timestamp(col.type):
+        col = col.cast(pa.timestamp("s", tz=col.type.tz), safe=False)
+    return pc.fill_null(col.cast(pa.int64()), missing).to_numpy(zero_copy_only=False)